@@ -1,8 +1,10 @@
+import numpy as np
 import pandas as pd
-from datetime import datetime
 
-from config import HOME_TEAM, AWAY_TEAM, DATA_DIR
-from data_io.loader import load_season
+from config import HOME_TEAM, AWAY_TEAM, DATA_DIR, DEFAULT_JOBS
+from data_io.catalog import season_columnar
+from data_io.parallel import map_reduce_seasons, concat_frames
+from match.lineups import LineupTimeline
 
 
 def compute_age(dob, match_date):
@@ -12,81 +14,152 @@ def compute_age(dob, match_date):
     return (match_date - dob).days / 365.25
 
 
-def build_age_elo_dataframe(season_files):
-    rows = []
-
-    for season_file in season_files:
-        season_data = load_season(season_file)
-
-        players = {
-            p["href"]: p
-            for p in season_data["players"]
-        }
-
-        for rnd in season_data["rounds"]:
-            for match in rnd["matches"]:
-
-                match_date = datetime.fromisoformat(
-                    match["date_time"].replace("Z", "")
-                )
-
-                home_goals, away_goals = match["result"]
-
-                if home_goals > away_goals:
-                    home_pts, away_pts = 3, 0
-                elif home_goals < away_goals:
-                    home_pts, away_pts = 0, 3
-                else:
-                    home_pts, away_pts = 1, 1
-
-                for team, lineup, pts in [
-                    (HOME_TEAM, match["home_lineup"], home_pts),
-                    (AWAY_TEAM, match["away_lineup"], away_pts),
-                ]:
-                    ages = []
-                    elos = []
-
-                    for player_href in lineup:
-                        if player_href not in players:
-                            continue
-
-                        p = players[player_href]
-
-                        if not p.get("dob") or p.get("elo") is None:
-                            continue
-
-                        dob = datetime.fromisoformat(p["dob"])
-                        age = compute_age(dob, match_date)
-
-                        ages.append(age)
-                        elos.append(p["elo"])
-
-                    if len(ages) < 7 or len(elos) < 7:
-                        continue
-
-                    rows.append({
-                        "season": season_data["season_id"],
-                        "team": team,
-                        "points": pts,
-                        "age_mean": sum(ages) / len(ages),
-                        "elo_mean": sum(elos) / len(elos),
-                        "match_id": match["id"]
-                    })
-
-    df = pd.DataFrame(rows)
-
-    df = df.merge(
-        df,
-        on="match_id",
-        suffixes=("", "_opp")
+def lineup_matrix(lineups, n_matches):
+    """
+    Titulares de una temporada columnar como matriz de índices de
+    jugador (2 * n_partidos, huecos): fila 2 * i local y 2 * i + 1
+    visitante del partido i, en el orden de la alineación (-1 = vacío).
+    """
+    starters = lineups["starter"]
+    key = 2 * lineups["match"][starters].astype(np.int64) + lineups["team"][starters]
+    player = lineups["player"][starters]
+
+    order = np.argsort(key, kind="stable")
+    key, player = key[order], player[order]
+
+    counts = np.bincount(key, minlength=2 * n_matches)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    slot = np.arange(len(key)) - starts[key]
+
+    matrix = np.full((2 * n_matches, counts.max(initial=0)), -1, dtype=np.int64)
+    matrix[key, slot] = player
+
+    return matrix
+
+def masked_mean(values, valid):
+    """
+    Media por fila de los valores válidos, sumando columna a columna
+    (mismo orden y mismo resultado que sum(lista) / len(lista)).
+    """
+    total = np.zeros(len(values))
+    for j in range(values.shape[1]):
+        total += np.where(valid[:, j], values[:, j], 0)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return total / valid.sum(axis=1)
+
+def opponent(values):
+    """
+    Para arrays por fila (local, visitante, local, ...): el valor del rival.
+    """
+    return values.reshape(-1, 2)[:, ::-1].ravel()
+
+def age_elo_table(season_file, catalog=None, career=None, exposure=False):
+    """
+    Tabla (season, team, points, age_mean, elo_mean, age_diff, elo_diff,
+    match_id) de una temporada, una fila por equipo y partido en orden
+    local, visitante. Solo entran los partidos en los que los dos equipos
+    tienen al menos 7 jugadores conocidos (con fecha de nacimiento y ELO).
+
+    Todo con los arrays de la temporada columnar: edades de los titulares
+    de todos los partidos a la vez con indexado de la matriz de alineaciones.
+    Las columnas del rival salen de emparejar las filas local y visitante
+    de cada partido por posición.
+
+    career: CareerIndex opcional; añade appearances_mean y
+    appearances_diff (media de apariciones previas de los titulares).
+    exposure: añade age_exposure_mean y elo_exposure_mean, medias de todos
+    los jugadores que pisan el campo ponderadas por minutos jugados
+    (ver match.lineups.LineupTimeline).
+    """
+    season = season_columnar(season_file, catalog)
+    matches = season["matches"]
+    players = season["players"]
+    n_matches = len(matches["id"])
+
+    lineup = lineup_matrix(season["lineups"], n_matches)
+    in_lineup = lineup >= 0
+    player = np.where(in_lineup, lineup, 0)
+
+    # dob y elo por hueco de alineación
+    dob = players["dob"][player]
+    elo = players["elo"][player]
+    valid = in_lineup & ~np.isnat(dob) & ~np.isnan(elo)
+
+    # días entre el nacimiento y la fecha del partido (como compute_age)
+    match_date = np.repeat(matches["date"], 2)
+    days = (match_date[:, None] - np.where(valid, dob, match_date[:, None])).astype(np.int64)
+    ages = days / 365.25
+
+    home_goals = matches["home_goals"].astype(np.int64)
+    away_goals = matches["away_goals"].astype(np.int64)
+    home_pts = np.select([home_goals > away_goals, home_goals < away_goals], [3, 0], default=1)
+    away_pts = np.select([home_goals > away_goals, home_goals < away_goals], [0, 3], default=1)
+
+    # fuera los partidos en los que algún equipo no llega a 7 conocidos
+    known = valid.sum(axis=1) >= 7
+    keep = np.repeat(known.reshape(-1, 2).all(axis=1), 2)
+
+    age_mean = masked_mean(ages, valid)
+    elo_mean = masked_mean(elo, valid)
+
+    columns = {}
+
+    if career is not None:
+        # apariciones previas de cada titular, búsqueda directa por hueco
+        codes = career.player_codes(players["href"])
+        ranks = np.repeat(career.match_ranks(matches["id"]), 2 * lineup.shape[1])
+        appearances, _, _ = career.prior_many(
+            np.where(in_lineup, codes[player], -1).ravel(), ranks
+        )
+        appearances_mean = masked_mean(appearances.reshape(lineup.shape), in_lineup)
+
+        columns["appearances_mean"] = appearances_mean[keep]
+        columns["appearances_diff"] = (appearances_mean - opponent(appearances_mean))[keep]
+
+    if exposure:
+        lineup_timeline = LineupTimeline(season)
+        stints = lineup_timeline.stints
+
+        stint_dob = players["dob"][stints["player"]]
+        stint_elo = players["elo"][stints["player"]]
+        stint_valid = ~np.isnat(stint_dob) & ~np.isnan(stint_elo)
+
+        stint_date = matches["date"][stints["match"]]
+        stint_days = (stint_date - np.where(stint_valid, stint_dob, stint_date)).astype(np.int64)
+
+        columns["age_exposure_mean"] = lineup_timeline.exposure_mean(stint_days / 365.25, stint_valid)[keep]
+        columns["elo_exposure_mean"] = lineup_timeline.exposure_mean(stint_elo, stint_valid)[keep]
+
+    return pd.DataFrame({
+        "season": np.full(np.count_nonzero(keep), season["season_id"]),
+        "team": np.tile([HOME_TEAM, AWAY_TEAM], n_matches)[keep],
+        "points": np.column_stack([home_pts, away_pts]).ravel()[keep],
+        "age_mean": age_mean[keep],
+        "elo_mean": elo_mean[keep],
+        "age_diff": (age_mean - opponent(age_mean))[keep],
+        "elo_diff": (elo_mean - opponent(elo_mean))[keep],
+        "match_id": np.repeat(matches["id"], 2)[keep],
+        **columns
+    })
+
+
+def build_age_elo_dataframe(season_files, jobs=DEFAULT_JOBS, career=None, exposure=False):
+    """
+    career: CareerIndex de todas las temporadas (ver analysis.career). Si
+    se indica, la tabla lleva además appearances_mean y appearances_diff.
+    exposure: añade age_exposure_mean y elo_exposure_mean (ver age_elo_table).
+    """
+    df = map_reduce_seasons(
+        age_elo_table,
+        season_files,
+        reduce=concat_frames,
+        jobs=jobs,
+        career=career,
+        exposure=exposure
     )
 
-    df = df[df["team"] != df["team_opp"]]
-
-    df["age_diff"] = df["age_mean"] - df["age_mean_opp"]
-    df["elo_diff"] = df["elo_mean"] - df["elo_mean_opp"]
-
-    df = df[[
+    columns = [
         "season",
         "team",
         "points",
@@ -94,9 +167,11 @@ def build_age_elo_dataframe(season_files):
         "elo_mean",
         "age_diff",
         "elo_diff"
-    ]]
-
-    return df
-
+    ]
 
+    if career is not None:
+        columns += ["appearances_mean", "appearances_diff"]
+    if exposure:
+        columns += ["age_exposure_mean", "elo_exposure_mean"]
 
+    return df[columns]
@@ -0,0 +1,110 @@
+import numpy as np
+
+from config import *
+from data_io.catalog import resolve_seasons, season_columnar
+from match.lineups import LineupTimeline
+
+
+class CareerIndex:
+    """
+    Historial de apariciones de cada jugador en todas las temporadas
+    (titulares y suplentes que entran, ver match.lineups.season_stints).
+
+    Las apariciones se ordenan una vez por jugador y fecha del partido
+    (date_time) y se acumulan con cumsum, así que las apariciones,
+    titularidades y minutos previos a cualquier partido salen de una
+    búsqueda binaria, sin recorrer otra vez los partidos anteriores.
+    """
+
+    def __init__(self, season_files):
+        season_files, catalog = resolve_seasons(season_files)
+
+        self.player_ids = {}
+        self.match_rank = {}
+
+        match_ids = []
+        date_times = []
+        records = {"match": [], "player": [], "started": [], "minutes": []}
+
+        for season_file in season_files:
+            season = season_columnar(season_file, catalog)
+
+            players = np.array([
+                self.player_ids.setdefault(href, len(self.player_ids))
+                for href in season["players"]["href"]
+            ], dtype=np.int64)
+
+            lineup_timeline = LineupTimeline(season)
+            stints = lineup_timeline.stints
+            match, player, started = stints["match"], stints["player"], stints["started"]
+            minutes = lineup_timeline.minutes_played()
+
+            records["match"].append(match + len(match_ids))
+            records["player"].append(players[player])
+            records["started"].append(started)
+            records["minutes"].append(minutes)
+
+            match_ids.extend(season["matches"]["id"].tolist())
+            date_times.extend(season["matches"]["date_time"].tolist())
+
+        # orden cronológico de los partidos (estable si coinciden)
+        order = np.argsort(np.array(date_times, dtype=str), kind="stable")
+        rank = np.empty(len(order), dtype=np.int64)
+        rank[order] = np.arange(len(order))
+        self.match_rank = dict(zip(match_ids, rank.tolist()))
+        self.n_matches = len(match_ids)
+
+        rank = rank[np.concatenate(records["match"] or [np.zeros(0, dtype=np.int64)])]
+        player = np.concatenate(records["player"] or [np.zeros(0, dtype=np.int64)])
+        started = np.concatenate(records["started"] or [np.zeros(0, dtype=bool)])
+        minutes = np.concatenate(records["minutes"] or [np.zeros(0, dtype=np.int64)])
+
+        # clave ordenada (jugador, partido) y acumulados hasta cada aparición
+        self.keys = player * (self.n_matches + 1) + rank
+        order = np.argsort(self.keys, kind="stable")
+        self.keys = self.keys[order]
+
+        self.player_start = np.searchsorted(
+            self.keys, np.arange(len(self.player_ids)) * (self.n_matches + 1)
+        )
+        self.cum_starts = np.concatenate(([0], np.cumsum(started[order])))
+        self.cum_minutes = np.concatenate(([0], np.cumsum(minutes[order])))
+
+    def player_codes(self, hrefs):
+        return np.array([self.player_ids.get(href, -1) for href in hrefs], dtype=np.int64)
+
+    def match_ranks(self, match_ids):
+        return np.array([self.match_rank[match_id] for match_id in match_ids], dtype=np.int64)
+
+    def prior_many(self, players, ranks):
+        """
+        Apariciones, titularidades y minutos de cada jugador (código de
+        player_codes, -1 = desconocido) en partidos anteriores al de
+        rango ranks. Devuelve tres arrays int64.
+        """
+        players = np.asarray(players, dtype=np.int64)
+        ranks = np.asarray(ranks, dtype=np.int64)
+        unknown = players < 0
+        players = np.where(unknown, 0, players)
+
+        pos = np.searchsorted(self.keys, players * (self.n_matches + 1) + ranks)
+        start = self.player_start[players] if len(self.player_start) else np.zeros_like(players)
+
+        appearances = np.where(unknown, 0, pos - start)
+        starts = np.where(unknown, 0, self.cum_starts[pos] - self.cum_starts[start])
+        minutes = np.where(unknown, 0, self.cum_minutes[pos] - self.cum_minutes[start])
+
+        return appearances, starts, minutes
+
+    def prior(self, href, match_id):
+        """
+        {"appearances", "starts", "minutes"} de href antes de match_id.
+        """
+        appearances, starts, minutes = self.prior_many(
+            self.player_codes([href]), self.match_ranks([match_id])
+        )
+        return {
+            "appearances": int(appearances[0]),
+            "starts": int(starts[0]),
+            "minutes": int(minutes[0])
+        }
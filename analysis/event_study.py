@@ -0,0 +1,119 @@
+import numpy as np
+import pandas as pd
+
+from config import *
+from data_io.catalog import SeasonCatalog
+from match.events import GoalIndex
+from analysis.var_disallowed import (
+    extract_trigger_events, build_control_candidates, ControlIndex,
+    match_controls, concede_analysis, cumulative_incidence
+)
+
+
+def event_study_curves(df_analysis, max_t=MAX_ANALYSIS_WINDOW, censored=False):
+    """
+    Curvas acumuladas de todos los estudios en una llamada.
+    Devuelve {(trigger, outcome, group): (times, cumulative_prob)}.
+    """
+    times = np.arange(0, max_t + 1)
+
+    codes, strata = pd.factorize(
+        pd.MultiIndex.from_frame(df_analysis[["trigger", "outcome", "group"]])
+    )
+
+    incidence = cumulative_incidence(
+        codes,
+        len(strata),
+        df_analysis["t_event"].to_numpy(),
+        df_analysis["event_occurred"].to_numpy(),
+        max_t,
+        censored
+    )
+
+    return {
+        stratum: (times, incidence[i])
+        for i, stratum in enumerate(strata)
+    }
+
+def run_event_studies(season_files, triggers=EVENT_STUDY_TRIGGERS, outcomes=EVENT_STUDY_OUTCOMES,
+                      BIN=DEFAULT_BIN, n_controls=DEFAULT_N_CONTROLS, seed=CONTROL_RANDOM_SEED,
+                      max_t=MAX_ANALYSIS_WINDOW, censored=False, jobs=DEFAULT_JOBS):
+    """
+    Estudio de eventos genérico: el análisis VAR (eventos, controles,
+    tiempo hasta el resultado, curvas) para cada tipo de evento de
+    triggers y cada resultado de outcomes.
+
+    Todos los estudios comparten una sola lectura de las temporadas
+    (SeasonCatalog), la tabla de candidatos (perezosa, con los estratos
+    de todos los disparadores) y un GoalIndex por resultado. Cada estudio
+    da lo mismo que si se ejecutara solo.
+
+    triggers: tipos de evento disparadores.
+    outcomes: {nombre: tipos de evento}; el resultado ocurre cuando el
+        rival protagoniza uno de esos eventos (p.ej. marca un gol).
+    Los minutos con eventos de RELEVANT_EVENTS o del propio disparador en
+    [minute - BIN, minute] no sirven como control de ese disparador.
+
+    Devuelve un dict con:
+    - events: disparadores (como extract_var_events + columna trigger)
+    - controls: controles elegidos (como match_controls + columna trigger)
+    - analysis: filas (trigger, outcome, group, state, t_event,
+      event_occurred), con group EVENT_GROUP o CONTROL_GROUP
+    - curves: ver event_study_curves
+    """
+    catalog = season_files if isinstance(season_files, SeasonCatalog) else SeasonCatalog(season_files)
+
+    df_events = extract_trigger_events(catalog, triggers, jobs=jobs)
+
+    # cada candidato lleva un bit por disparador con eventos cercanos
+    df_candidates = build_control_candidates(
+        catalog, BIN, jobs=jobs, df_var=df_events,
+        relevant_events=RELEVANT_EVENTS,
+        flag_events=[{trigger} for trigger in triggers]
+    )
+    near_events = df_candidates["near_events"].to_numpy()
+    df_candidates = df_candidates.drop(columns="near_events")
+
+    match_lookup = catalog.match_lookup()
+    outcome_indexes = {
+        outcome: GoalIndex(match_lookup, event_types=event_types)
+        for outcome, event_types in outcomes.items()
+    }
+
+    controls = []
+    analysis = []
+
+    for bit, trigger in enumerate(triggers):
+        df_trigger = df_events[df_events["trigger"] == trigger]
+        if len(df_trigger) == 0:
+            continue
+
+        index = ControlIndex(df_candidates[((near_events >> bit) & 1) == 0])
+        df_control = match_controls(df_trigger, index, BIN, n_controls, seed=seed)
+        if len(df_control):
+            df_control.insert(0, "trigger", trigger)
+            controls.append(df_control)
+
+        for outcome, outcome_index in outcome_indexes.items():
+            for df_rows, group, window_column in [
+                (df_trigger, EVENT_GROUP, "minute"),
+                (df_control, CONTROL_GROUP, "var_minute")
+            ]:
+                df_outcome = concede_analysis(df_rows, outcome_index, group, window_column)
+                if len(df_outcome) == 0:
+                    continue
+
+                df_outcome.insert(0, "outcome", outcome)
+                df_outcome.insert(0, "trigger", trigger)
+                analysis.append(df_outcome)
+
+    df_analysis = pd.concat(analysis, ignore_index=True) if analysis else pd.DataFrame(
+        columns=["trigger", "outcome", "group", "state", "t_event", "event_occurred"]
+    )
+
+    return {
+        "events": df_events,
+        "controls": pd.concat(controls, ignore_index=True) if controls else pd.DataFrame(),
+        "analysis": df_analysis,
+        "curves": event_study_curves(df_analysis, max_t, censored) if len(df_analysis) else {}
+    }
@@ -1,157 +1,213 @@
+from bisect import bisect_right
+
+import numpy as np
 import pandas as pd
-from collections import defaultdict
 
-from config import MATCH_START_MINUTE, MATCH_END_MINUTE, GOLEADA_THRESHOLD, CARD_EVENTS
-from match.state import score_at_minute
-from data_io.loader import load_season
+from config import MATCH_START_MINUTE, MATCH_END_MINUTE, GOLEADA_THRESHOLD, CARD_EVENTS, EVENT_CODES, DEFAULT_JOBS
+from match.state import StateSegments, as_timeline
+from data_io.catalog import season_columnar
+from data_io.parallel import map_reduce_seasons
 
 
 def goleada_intervals(events):
     """
     Devuelve una lista de intervalos [start, end] (ambos inclusive)
     en los que algún equipo va perdiendo por GOLEADA_THRESHOLD o más goles.
+
+    events: lista de eventos o MatchTimeline del partido.
     """
     intervals = []
+    run_start = None
+
+    # tramos de estado (MatchTimeline.segments) dentro del partido
+    for start, end, home_goals, away_goals, _, _ in as_timeline(events).segments():
+        start, end = max(start, MATCH_START_MINUTE), min(end, MATCH_END_MINUTE)
+        if start > end:
+            continue
+
+        if abs(home_goals - away_goals) >= GOLEADA_THRESHOLD:
+            if run_start is None:
+                run_start = start
+            run_end = end
+            continue
 
-    in_goleada = False
-    start_minute = None
-
-    for minute in range(MATCH_START_MINUTE, MATCH_END_MINUTE + 1):
-        home_goals, away_goals = score_at_minute(events, minute)
-        diff = home_goals - away_goals
-
-        goleada_now = abs(diff) >= GOLEADA_THRESHOLD
-
-        # Empieza la goleada
-        if goleada_now and not in_goleada:
-            start_minute = min(minute + 1, MATCH_END_MINUTE)
-            in_goleada = True
-        # Termina la goleada
-        elif not goleada_now and in_goleada:
-            if start_minute <= minute - 1:
-                intervals.append({
-                    "start": start_minute,
-                    "end": minute - 1
-                })
-            in_goleada = False
-            start_minute = None
+        # Termina la goleada: el intervalo empieza el minuto siguiente
+        if run_start is not None and run_start + 1 <= run_end:
+            intervals.append({"start": run_start + 1, "end": run_end})
+        run_start = None
 
     # Si el partido termina en goleada
-    if in_goleada and start_minute and start_minute <= MATCH_END_MINUTE:
+    if run_start is not None:
         intervals.append({
-            "start": start_minute,
+            "start": min(run_start + 1, MATCH_END_MINUTE),
             "end": MATCH_END_MINUTE
         })
 
     return intervals
 
-def accumulate_minutes_by_diff(events, accumulator):
+def minute_in_goleada(minute, intervals):
     """
-    Acumula minutos jugados en situación de goleada,
-    desglosados por diferencia exacta de goles.
-
-    accumulator: dict[int, int]
-        clave = diferencia de goles (3, 4, 5, ...)
-        valor = minutos acumulados
+    intervals: salida de goleada_intervals (ordenados y sin solaparse),
+    así que basta una búsqueda binaria por start.
     """
-    intervals = goleada_intervals(events)
-
-    for interval in intervals:
-        for minute in range(interval["start"], interval["end"] + 1):
-            home_goals, away_goals = score_at_minute(events, minute)
-            diff = abs(home_goals - away_goals)
-
-            if diff < GOLEADA_THRESHOLD:
-                continue
-
-            accumulator[diff] = accumulator.get(diff, 0) + 1
-
-def minute_in_goleada(minute, intervals):
-    for interval in intervals:
-        if interval["start"] <= minute <= interval["end"]:
-            return True
+    if minute > MATCH_END_MINUTE:
         # permitir descuento
-        if minute > MATCH_END_MINUTE and interval["end"] == MATCH_END_MINUTE:
-            return True
-    return False
+        return bool(intervals) and intervals[-1]["end"] == MATCH_END_MINUTE
+
+    i = bisect_right(intervals, minute, key=lambda interval: interval["start"]) - 1
+    return i >= 0 and minute <= intervals[i]["end"]
 
-def accumulate_cards_by_diff(events, accumulator):
+def segment_depths(segments):
     """
-    Acumula tarjetas producidas durante situaciones de goleada,
-    desglosadas por diferencia exacta de goles.
-
-    accumulator: dict[str, dict[int, int]]
-        {
-          "Yellow card": {3: x, 4: y, ...},
-          "Red card": {...},
-          "2nd yellow card leads to red card": {...}
-        }
+    Histograma de minutos MATCH_START_MINUTE..MATCH_END_MINUTE por
+    (|diferencia|, depth) a partir de los tramos de estado (StateSegments),
+    con un peso por tramo en vez de uno por minuto.
+
+    depth es el mayor umbral para el que el minuto cae dentro de
+    goleada_intervals: con umbral T el minuto es de goleada si y solo si
+    depth >= T (T >= 1). El primer minuto de cada goleada no cuenta (el
+    intervalo empieza en el siguiente), salvo si es el último minuto; así
+    depth es min(diff, diff del minuto anterior), 0 en el primer minuto y
+    la propia diff en el último.
+
+    Devuelve (diffs, depths, weights).
     """
-    intervals = goleada_intervals(events)
-
-    if not intervals:
-        return
+    diffs = np.abs(segments.goal_diff())
+    same_match = np.concatenate(([False], segments.match[1:] == segments.match[:-1]))
+    previous = np.where(same_match, np.concatenate(([0], diffs[:-1])), 0)
+
+    first = np.maximum(segments.start, MATCH_START_MINUTE)
+    weights = segments.durations()
+    inside = weights > 0
+
+    # el primer minuto del tramo depende del tramo anterior
+    first_depth = np.select(
+        [first == MATCH_END_MINUTE, first == MATCH_START_MINUTE],
+        [diffs, 0],
+        default=np.minimum(diffs, previous)
+    )
+
+    return (
+        np.concatenate([diffs[inside], diffs[inside]]),
+        np.concatenate([first_depth[inside], diffs[inside]]),
+        np.concatenate([np.ones(np.count_nonzero(inside), dtype=np.int64), weights[inside] - 1])
+    )
+
+def card_depths(segments, match_idx, minutes):
+    """
+    (|diferencia|, depth) de segment_depths en el minuto de cada tarjeta.
+    Las del descuento cuentan como el último minuto.
+    """
+    minutes = np.asarray(minutes, dtype=np.int64)
+    abs_diff = np.abs(segments.goal_diff())
+
+    diff = abs_diff[segments.segment_at(match_idx, minutes)]
+    previous = abs_diff[segments.segment_at(match_idx, minutes - 1)]
+    last = abs_diff[segments.segment_at(match_idx, np.full_like(minutes, MATCH_END_MINUTE))]
+
+    depth = np.select(
+        [
+            minutes >= MATCH_END_MINUTE,
+            minutes > MATCH_START_MINUTE
+        ],
+        [last, np.minimum(diff, previous)],
+        default=0
+    )
+
+    return diff, depth
+
+def histogram_matrix(diffs, depths, size, weights=None):
+    hist = np.zeros((size, size), dtype=np.int64)
+    np.add.at(hist, (diffs, depths), 1 if weights is None else weights)
+    return hist
+
+def fair_play_rows_from_histogram(season_id, minute_hist, card_hist, threshold):
+    """
+    Filas de la tabla de fair play de una temporada para un umbral,
+    sumando colas del histograma:
+    - goleada, diff d >= umbral: minutos/tarjetas con diff d y depth >= umbral
+    - outside: minutos con diff < umbral y tarjetas con diff y depth < umbral
+    """
+    if threshold < 1:
+        raise ValueError("El umbral de goleada debe ser >= 1")
 
-    for e in events:
-        event_type = e["type"]
-        minute = e["minute"]
+    rows = []
 
-        if event_type not in CARD_EVENTS:
-            continue
+    minutes = minute_hist
+    yellow = card_hist["Yellow card"]
+    red = card_hist["Red card"]
+    second_yellow_red = card_hist["2nd yellow card leads to red card"]
 
-        if not minute_in_goleada(minute, intervals):
+    for diff in range(threshold, len(minutes)):
+        diff_minutes = int(minutes[diff, threshold:].sum())
+        if diff_minutes == 0:
             continue
 
-        home_goals, away_goals = score_at_minute(events, minute)
-        diff = abs(home_goals - away_goals)
-
-        if diff < GOLEADA_THRESHOLD:
-            continue
+        rows.append({
+            "season": season_id,
+            "diff": diff,
+            "minutes": diff_minutes,
+            "yellow": int(yellow[diff, threshold:].sum()),
+            "red": int(red[diff, threshold:].sum()),
+            "second_yellow_red": int(second_yellow_red[diff, threshold:].sum())
+        })
 
-        if event_type not in accumulator:
-            accumulator[event_type] = {}
+    rows.append({
+        "season": season_id,
+        "diff": "outside",
+        "minutes": int(minutes[:threshold].sum()),
+        "yellow": int(yellow[:threshold, :threshold].sum()),
+        "red": int(red[:threshold, :threshold].sum()),
+        "second_yellow_red": int(second_yellow_red[:threshold, :threshold].sum())
+    })
 
-        accumulator[event_type][diff] = accumulator[event_type].get(diff, 0) + 1
+    return rows
 
-def accumulate_minutes_outside_goleada(events, accumulator):
+def fair_play_rows(season_file, catalog=None, thresholds=None):
     """
-    Acumula minutos jugados fuera de situación de goleada (diff < GOLEADA_THRESHOLD).
-    """
-    intervals = goleada_intervals(events)
+    Filas de la tabla de fair play (ver build_fair_play_table)
+    para una sola temporada.
 
-    for minute in range(MATCH_START_MINUTE, MATCH_END_MINUTE + 1):
-        if minute_in_goleada(minute, intervals):
-            continue
+    Minutos y tarjetas se cuentan por (|diferencia|, depth) (ver
+    segment_depths) sobre los tramos de estado de la temporada columnar;
+    con ese histograma salen las tablas de cualquier umbral.
+    """
+    season = season_columnar(season_file, catalog)
+    segments = StateSegments(season)
+    events = season["events"]
 
-        home_goals, away_goals = score_at_minute(events, minute)
-        diff = abs(home_goals - away_goals)
+    minute_diffs, minute_depths, minute_weights = segment_depths(segments)
 
-        if diff < GOLEADA_THRESHOLD:
-            accumulator["minutes"] += 1
+    cards = {}
+    for event_type in CARD_EVENTS:
+        is_card = events["type"] == EVENT_CODES[event_type]
+        cards[event_type] = card_depths(segments, events["match"][is_card], events["minute"][is_card])
 
-def accumulate_cards_outside_goleada(events, accumulator):
-    """
-    Acumula tarjetas producidas fuera de situaciones de goleada.
-    """
-    intervals = goleada_intervals(events)
+    size = 1 + max(
+        [GOLEADA_THRESHOLD, *(thresholds or [])]
+        + [int(minute_diffs.max(initial=0))]
+        + [int(diff.max(initial=0)) for diff, _ in cards.values()]
+    )
 
-    for e in events:
-        event_type = e["type"]
-        minute = e["minute"]
+    minutes = histogram_matrix(minute_diffs, minute_depths, size, minute_weights)
+    cards = {
+        event_type: histogram_matrix(diff, depth, size)
+        for event_type, (diff, depth) in cards.items()
+    }
 
-        if event_type not in CARD_EVENTS:
-            continue
+    season_id = season["season_id"]
 
-        if minute_in_goleada(minute, intervals):
-            continue
+    if thresholds is None:
+        return fair_play_rows_from_histogram(season_id, minutes, cards, GOLEADA_THRESHOLD)
 
-        home_goals, away_goals = score_at_minute(events, minute)
-        diff = abs(home_goals - away_goals)
+    rows = []
+    for threshold in thresholds:
+        for row in fair_play_rows_from_histogram(season_id, minutes, cards, threshold):
+            rows.append({"threshold": threshold, **row})
 
-        if diff < GOLEADA_THRESHOLD:
-            accumulator[event_type] += 1
+    return rows
 
-def build_fair_play_table(season_files):
+def build_fair_play_table(season_files, jobs=DEFAULT_JOBS, thresholds=None):
     """
     Construye una tabla con métricas de fair play en situaciones de goleada
     y fuera de goleada.
@@ -163,63 +219,19 @@ def build_fair_play_table(season_files):
     - yellow
     - red
     - second_yellow_red
-    """
-    rows = []
 
-    for season_file in season_files:
-        season_data = load_season(season_file)
-        season_id = season_data["season_id"]
-
-        minutes_by_diff = defaultdict(int)
-
-        cards_by_diff = {
-            "Yellow card": defaultdict(int),
-            "Red card": defaultdict(int),
-            "2nd yellow card leads to red card": defaultdict(int)
-        }
-
-        minutes_outside = {"minutes": 0}
-
-        cards_outside = {
-            "Yellow card": 0,
-            "Red card": 0,
-            "2nd yellow card leads to red card": 0
-        }
-
-        for rnd in season_data["rounds"]:
-            for match in rnd["matches"]:
-                events = match["events"]
-
-                # goleada
-                accumulate_minutes_by_diff(events, minutes_by_diff)
-                accumulate_cards_by_diff(events, cards_by_diff)
-
-                # fuera de goleada
-                accumulate_minutes_outside_goleada(events, minutes_outside)
-                accumulate_cards_outside_goleada(events, cards_outside)
-
-        diffs = sorted(
-            d for d in minutes_by_diff.keys()
-            if d >= GOLEADA_THRESHOLD
-        )
-
-        for diff in diffs:
-            rows.append({
-                "season": season_id,
-                "diff": diff,
-                "minutes": minutes_by_diff.get(diff, 0),
-                "yellow": cards_by_diff["Yellow card"].get(diff, 0),
-                "red": cards_by_diff["Red card"].get(diff, 0),
-                "second_yellow_red": cards_by_diff["2nd yellow card leads to red card"].get(diff, 0)
-            })
-
-        rows.append({
-            "season": season_id,
-            "diff": "outside",
-            "minutes": minutes_outside["minutes"],
-            "yellow": cards_outside["Yellow card"],
-            "red": cards_outside["Red card"],
-            "second_yellow_red": cards_outside["2nd yellow card leads to red card"]
-        })
+    season_files: lista de ficheros o SeasonCatalog.
+    jobs: procesos para repartir las temporadas (ver data_io.parallel).
+    thresholds: lista de umbrales de goleada (modo barrido). Si se indica,
+        la tabla lleva además una columna threshold con las filas de cada
+        umbral; todas salen del mismo histograma por temporada.
+        Por defecto se usa solo GOLEADA_THRESHOLD.
+    """
+    rows = map_reduce_seasons(
+        fair_play_rows,
+        season_files,
+        jobs=jobs,
+        thresholds=thresholds
+    )
 
     return pd.DataFrame(rows)
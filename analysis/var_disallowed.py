@@ -1,235 +1,586 @@
+from functools import partial
+
 import numpy as np
 import pandas as pd
 
 from config import *
-from data_io.loader import load_season
-from match.events import time_to_concede
-from match.state import players_on_field, score_at_minute, match_state_at_minute
-
-RELEVANT_EVENTS = {
-    "Goal",
-    "Goal from penalty",
-    "Own goal",
-    "Goal disallowed",
-    "Goal disallowed by VAR",
-    "Red card",
-    "2nd yellow card leads to red card",
-    "Missed penalty",
-    "Penalty saved"
-}
-
-def extract_var_events(season_files):
-    VAR_EVENTS = []
-
-    season_file: str
-    for season_file in season_files:
-        season_data = load_season(season_file)
-
-        for rnd in season_data["rounds"]:
-            for match in rnd["matches"]:
-                events = match["events"]
-
-                for e in events:
-                    if e["type"] != VAR_EVENT_TYPE:
-                        continue
-
-                    minute = e["minute"]
-                    team = e["team"]
-
-                    # Numero de jugadores de cada equipo
-                    home_players, away_players = players_on_field(events, minute)
-
-                    if team == "home":
-                        team_players = home_players
-                        opp_players = away_players
-                    else:
-                        team_players = away_players
-                        opp_players = home_players
-
-                    # Marcador, diferencia de goles del partido, estado del partido
-                    home_goals, away_goals = score_at_minute(events, minute)
-
-                    if team == "home":
-                        goal_diff = home_goals - away_goals
-                    else:
-                        goal_diff = away_goals - home_goals
-
-                    if goal_diff > 0:
-                        state = STATE_WINNING
-                    elif goal_diff < 0:
-                        state = STATE_LOSING
-                    else:
-                        state = STATE_DRAWING
-
-                    VAR_EVENTS.append({
-                        "season": season_data["season_id"],
-                        "match_id": match["id"],
-                        "minute": minute,
-                        "team": team,
-                        "home_goals": home_goals,
-                        "away_goals": away_goals,
-                        "goal_diff": goal_diff,
-                        "state": state,
-                        "team_players": team_players,
-                        "opp_players": opp_players
-                    })
-    return pd.DataFrame(VAR_EVENTS)
-
-def build_control_candidates(season_files, BIN):
-    CONTROL_CANDIDATES = []
-
-    for season_file in season_files:
-        season_data = load_season(season_file)
-
-        for rnd in season_data["rounds"]:
-            for match in rnd["matches"]:
-                events = match["events"]
-
-                # indexar eventos por minuto
-                events_by_minute = {}
-                for e in events:
-                    events_by_minute.setdefault(e["minute"], []).append(e)
-
-                for minute in range(MATCH_START_MINUTE, MATCH_MAX_MINUTE_ITER):
-                    # excluir si hay evento relevante en el minute-bin
-                    skip = False
-                    for m in range(minute - BIN, minute + 1):
-                        for e in events_by_minute.get(m, []):
-                            if e["type"] in RELEVANT_EVENTS:
-                                skip = True
-                                break
-                        if skip:
-                            break
-                    if skip:
-                        continue
-
-                    for team in ["home", "away"]:
-                        state_info = match_state_at_minute(events, minute, team)
-
-                        CONTROL_CANDIDATES.append({
-                            "season": season_data["season_id"],
-                            "match_id": match["id"],
-                            "minute": minute,
-                            "team": team,
-                            "state": state_info["state"],
-                            "goal_diff": state_info["goal_diff"],
-                            "team_players": state_info["team_players"],
-                            "opp_players": state_info["opp_players"]
-                        })
-
-    return pd.DataFrame(CONTROL_CANDIDATES)
-
-def match_controls(df_var, df_control_candidates, BIN, n_controls=DEFAULT_N_CONTROLS):
-    CONTROL_SAMPLES = []
-
-    for _, var_row in df_var.iterrows():
-        candidates = df_control_candidates[
-            (df_control_candidates["state"] == var_row["state"]) &
-            (df_control_candidates["team"] == var_row["team"]) &
-            (df_control_candidates["team_players"] == INITIAL_PLAYERS) &
-            (df_control_candidates["opp_players"] == INITIAL_PLAYERS) &
-            (abs(df_control_candidates["minute"] - var_row["minute"]) <= BIN)
-        ]
-
+from data_io.catalog import season_columnar
+from data_io.loader import event_type_mask
+from data_io.parallel import map_reduce_seasons, concat_frames, parallel_map
+from match.events import as_goal_index
+from match.state import season_state_tensor, HOME_GOALS, AWAY_GOALS, HOME_PLAYERS, AWAY_PLAYERS
+
+# columnas de extract_var_events (también sin eventos VAR)
+VAR_EVENT_COLUMNS = [
+    "season", "match_id", "minute", "team", "home_goals", "away_goals",
+    "goal_diff", "state", "team_players", "opp_players"
+]
+
+def trigger_event_table(season_file, trigger_types, catalog=None):
+    """
+    Eventos disparadores de una temporada (cualquier tipo de trigger_types)
+    con el estado del partido en su minuto y una columna trigger con el
+    tipo de evento. Todo con arrays columnares.
+    """
+    season = season_columnar(season_file, catalog)
+    events = season["events"]
+
+    mask = event_type_mask(season, trigger_types)
+
+    match_idx = events["match"][mask]
+    minute = events["minute"][mask].astype(np.int64)
+    away = events["team"][mask] == TEAM_CODES[AWAY_TEAM]
+
+    # estado con los eventos de minuto < minute (como MatchTimeline)
+    n_minutes = max(STATE_TENSOR_MINUTES, int(minute.max(initial=0)) + 1)
+    state = season_state_tensor(season, n_minutes)[match_idx, minute].astype(np.int64)
+    home_goals, away_goals = state[:, HOME_GOALS], state[:, AWAY_GOALS]
+    home_players, away_players = state[:, HOME_PLAYERS], state[:, AWAY_PLAYERS]
+
+    goal_diff = np.where(away, away_goals - home_goals, home_goals - away_goals)
+
+    return pd.DataFrame({
+        "trigger": np.array(season["event_types"], dtype=object)[events["type"][mask]],
+        "season": np.full(len(minute), season["season_id"]),
+        "match_id": season["matches"]["id"][match_idx],
+        "minute": minute,
+        "team": np.where(away, AWAY_TEAM, HOME_TEAM),
+        "home_goals": home_goals,
+        "away_goals": away_goals,
+        "goal_diff": goal_diff,
+        "state": state_labels(goal_diff),
+        "team_players": np.where(away, away_players, home_players),
+        "opp_players": np.where(away, home_players, away_players)
+    })
+
+def extract_trigger_events(season_files, trigger_types, jobs=DEFAULT_JOBS):
+    return map_reduce_seasons(
+        trigger_event_table,
+        season_files,
+        reduce=concat_frames,
+        jobs=jobs,
+        trigger_types=set(trigger_types)
+    )
+
+def extract_var_events(season_files, jobs=DEFAULT_JOBS):
+    df_var = extract_trigger_events(season_files, [VAR_EVENT_TYPE], jobs=jobs)
+
+    return df_var.drop(columns="trigger")[VAR_EVENT_COLUMNS]
+
+def relevant_event_window(season, BIN, minutes, relevant_events=None):
+    """
+    Máscara (n_partidos, len(minutes)): True si hay algún evento de
+    relevant_events (por defecto RELEVANT_EVENTS) en [minute - BIN, minute]
+    de ese partido.
+
+    Se cuenta cuántos eventos relevantes hay en cada minuto y la ventana
+    deslizante sale de la diferencia de sus sumas acumuladas.
+    """
+    events = season["events"]
+    n_matches = len(season["matches"]["id"])
+
+    if relevant_events is None:
+        relevant = (season["event_categories"][events["type"]] & VAR_RELEVANT_BIT) != 0
+    else:
+        relevant = event_type_mask(season, relevant_events)
+
+    event_minutes = events["minute"][relevant].astype(np.int64)
+    n_slots = max(int(minutes.max(initial=0)), int(event_minutes.max(initial=0))) + 2
+
+    counts = np.zeros((n_matches, n_slots), dtype=np.int32)
+    np.add.at(counts, (events["match"][relevant], event_minutes + 1), 1)
+    cumulative = np.cumsum(counts, axis=1)
+
+    # eventos con minuto en [minute - BIN, minute]
+    upper = cumulative[:, minutes + 1]
+    lower = cumulative[:, np.clip(minutes - BIN, 0, None)]
+
+    return upper > lower
+
+def state_labels(goal_diff):
+    return np.select(
+        [goal_diff > 0, goal_diff < 0],
+        [STATE_WINNING, STATE_LOSING],
+        default=STATE_DRAWING
+    )
+
+def control_strata(df_var, BIN):
+    """
+    Estratos que match_controls llegará a consultar para estos eventos
+    VAR: {(state, team): máscara de minutos 0..MATCH_MAX_MINUTE_ITER - 1}
+    con los minutos a ±BIN de algún evento VAR de ese estado y equipo.
+    Sin eventos VAR (temporadas anteriores al VAR) devuelve {}.
+    """
+    strata = {}
+
+    if len(df_var) == 0:
+        return strata
+
+    for state, team, minute in zip(df_var["state"], df_var["team"], df_var["minute"]):
+        mask = strata.setdefault((state, team), np.zeros(MATCH_MAX_MINUTE_ITER, dtype=bool))
+        mask[max(minute - BIN, 0):minute + BIN + 1] = True
+
+    return strata
+
+def control_candidate_table(season_file, BIN, catalog=None, strata=None,
+                            relevant_events=None, flag_events=None):
+    """
+    Candidatos a control de una temporada: cada (partido, minuto, equipo)
+    de los minutos MATCH_START_MINUTE..MATCH_MAX_MINUTE_ITER - 1 sin eventos
+    relevantes en [minute - BIN, minute]. Todo con arrays columnares.
+
+    strata: resultado de control_strata. Si se indica, solo se generan
+    los candidatos 11 contra 11 de esos estratos y minutos (el resto
+    nunca lo usa match_controls).
+    relevant_events: tipos de evento que descartan un minuto como control
+        (por defecto RELEVANT_EVENTS).
+    flag_events: lista de conjuntos de tipos de evento. Si se indica, se
+        añade la columna near_events con el bit i activo cuando hay algún
+        evento de flag_events[i] en [minute - BIN, minute] (como mucho 64).
+    """
+    season = season_columnar(season_file, catalog)
+    minutes = np.arange(MATCH_START_MINUTE, MATCH_MAX_MINUTE_ITER)
+
+    if strata is not None:
+        needed = np.zeros(MATCH_MAX_MINUTE_ITER, dtype=bool)
+        for mask in strata.values():
+            needed |= mask
+        minutes = minutes[needed[minutes]]
+
+    # excluir si hay evento relevante en el minute-bin
+    keep = ~relevant_event_window(season, BIN, minutes, relevant_events)
+    match_idx, minute_pos = np.nonzero(keep)
+    minute = minutes[minute_pos]
+
+    state = season_state_tensor(season)[match_idx, minute].astype(np.int64)
+    home_goals, away_goals = state[:, HOME_GOALS], state[:, AWAY_GOALS]
+    home_players, away_players = state[:, HOME_PLAYERS], state[:, AWAY_PLAYERS]
+
+    # dos filas por minuto: local y visitante
+    goal_diff = np.column_stack([home_goals - away_goals, away_goals - home_goals]).ravel()
+    team_players = np.column_stack([home_players, away_players]).ravel()
+    opp_players = np.column_stack([away_players, home_players]).ravel()
+
+    columns = {
+        "match_id": np.repeat(season["matches"]["id"][match_idx], 2),
+        "minute": np.repeat(minute, 2).astype(np.int64),
+        "team": np.tile([HOME_TEAM, AWAY_TEAM], len(minute)),
+        "state": state_labels(goal_diff),
+        "goal_diff": goal_diff,
+        "team_players": team_players,
+        "opp_players": opp_players
+    }
+
+    if flag_events is not None:
+        near = np.zeros(len(minute), dtype=np.int64)
+        for bit, event_types in enumerate(flag_events):
+            window = relevant_event_window(season, BIN, minutes, event_types)[match_idx, minute_pos]
+            near |= window.astype(np.int64) << bit
+        columns["near_events"] = np.repeat(near, 2)
+
+    if strata is not None:
+        rows = np.zeros(len(goal_diff), dtype=bool)
+        for (state, team), mask in strata.items():
+            rows |= (
+                (columns["state"] == state) &
+                (columns["team"] == team) &
+                mask[columns["minute"]]
+            )
+        rows &= (team_players == INITIAL_PLAYERS) & (opp_players == INITIAL_PLAYERS)
+
+        columns = {name: values[rows] for name, values in columns.items()}
+
+    return pd.DataFrame({
+        "season": np.full(len(columns["minute"]), season["season_id"]),
+        **columns
+    })
+
+def build_control_candidates(season_files, BIN, jobs=DEFAULT_JOBS, df_var=None,
+                             relevant_events=None, flag_events=None):
+    """
+    Tabla de candidatos a control de todas las temporadas.
+
+    df_var: si se pasan los eventos VAR, modo perezoso: solo se generan
+    los candidatos de sus estratos y ventanas ±BIN (ver control_strata).
+    match_controls devuelve lo mismo que con la tabla completa.
+    relevant_events, flag_events: ver control_candidate_table.
+    """
+    strata = None if df_var is None else control_strata(df_var, BIN)
+
+    return map_reduce_seasons(
+        control_candidate_table,
+        season_files,
+        reduce=concat_frames,
+        jobs=jobs,
+        BIN=BIN,
+        strata=strata,
+        relevant_events=relevant_events,
+        flag_events=flag_events
+    )
+
+class ControlIndex:
+    """
+    Candidatos a control 11 contra 11 agrupados por (state, team), con
+    sus minutos ordenados: la ventana ±BIN de cada evento VAR se encuentra
+    con dos np.searchsorted en vez de filtrar la tabla entera.
+    """
+
+    def __init__(self, df_control_candidates):
+        self.candidates = df_control_candidates.reset_index(drop=True)
+        self.strata = {}
+
+        if len(self.candidates) == 0:
+            return
+
+        eligible = (
+            (self.candidates["team_players"].to_numpy() == INITIAL_PLAYERS) &
+            (self.candidates["opp_players"].to_numpy() == INITIAL_PLAYERS)
+        )
+        positions = np.flatnonzero(eligible)
+        minutes = self.candidates["minute"].to_numpy()[positions]
+
+        strata = self.candidates.iloc[positions].groupby(["state", "team"], sort=False).indices
+
+        for key, members in strata.items():
+            # estable: a igual minuto se conserva el orden de la tabla
+            order = np.argsort(minutes[members], kind="stable")
+            self.strata[key] = (minutes[members][order], positions[members][order])
+
+    def window(self, state, team, minute, BIN):
+        """
+        Posiciones (en orden de la tabla) de los candidatos del estrato
+        con |minute_candidato - minute| <= BIN.
+        """
+        if (state, team) not in self.strata:
+            return np.zeros(0, dtype=np.int64)
+
+        minutes, positions = self.strata[(state, team)]
+        lo = np.searchsorted(minutes, minute - BIN, side="left")
+        hi = np.searchsorted(minutes, minute + BIN, side="right")
+
+        return np.sort(positions[lo:hi])
+
+
+def as_control_index(df_control_candidates):
+    """
+    Acepta la tabla de candidatos o un ControlIndex ya construido.
+    """
+    if isinstance(df_control_candidates, ControlIndex):
+        return df_control_candidates
+    return ControlIndex(df_control_candidates)
+
+def control_windows(df_var, df_control_candidates, BIN):
+    """
+    Para cada evento VAR, posiciones de sus candidatos a control
+    (ver ControlIndex.window), en el orden de df_var.
+    """
+    index = as_control_index(df_control_candidates)
+
+    return [
+        index.window(state, team, minute, BIN)
+        for state, team, minute in zip(df_var["state"], df_var["team"], df_var["minute"])
+    ]
+
+def draw_controls(windows, n_controls, rng):
+    """
+    Un sorteo de controles: para cada ventana no vacía, hasta n_controls
+    posiciones (de la ventana) sin reemplazo. Devuelve {i: elegidos}.
+    """
+    draws = {}
+
+    for i, candidates in enumerate(windows):
         if len(candidates) == 0:
             continue
 
-        sampled = candidates.sample(
-            n=min(n_controls, len(candidates)),
-            replace=False,
-            random_state=CONTROL_RANDOM_SEED
-        )
-
-        for _, row in sampled.iterrows():
-            CONTROL_SAMPLES.append({
-                **row.to_dict(),
-                "var_minute": var_row["minute"]
-            })
-
-    return pd.DataFrame(CONTROL_SAMPLES)
-
+        n = min(n_controls, len(candidates))
+        draws[i] = rng.choice(len(candidates), size=n, replace=False)
+
+    return draws
+
+def match_controls(df_var, df_control_candidates, BIN, n_controls=DEFAULT_N_CONTROLS,
+                   seed=CONTROL_RANDOM_SEED, legacy_sampling=False):
+    """
+    Para cada evento VAR elige hasta n_controls candidatos con el mismo
+    estado y equipo, 11 contra 11 y a ±BIN minutos.
+
+    df_control_candidates: tabla de candidatos o ControlIndex.
+    seed: semilla (o np.random.Generator) del muestreo.
+    legacy_sampling: reproduce exactamente la selección anterior
+        (DataFrame.sample(random_state=seed) por cada evento VAR).
+    """
+    index = as_control_index(df_control_candidates)
+    windows = control_windows(df_var, index, BIN)
+
+    if legacy_sampling:
+        draws = {
+            i: np.random.RandomState(seed).choice(
+                len(candidates), size=min(n_controls, len(candidates)), replace=False
+            )
+            for i, candidates in enumerate(windows)
+            if len(candidates) > 0
+        }
+    else:
+        draws = draw_controls(windows, n_controls, np.random.default_rng(seed))
+
+    if not draws:
+        return pd.DataFrame()
+
+    var_minutes = df_var["minute"].to_numpy()
+
+    df_control = index.candidates.iloc[
+        np.concatenate([windows[i][chosen] for i, chosen in draws.items()])
+    ].reset_index(drop=True)
+    df_control["var_minute"] = np.concatenate([
+        np.full(len(chosen), var_minutes[i]) for i, chosen in draws.items()
+    ])
+
+    return df_control
+
+def concede_analysis(df, match_lookup, group, window_column, min_minute=MIN_ANALYSIS_MINUTE):
+    """
+    Filas (group, state, t_event, event_occurred) para cada fila de df,
+    contando los goles encajados desde df["minute"]. La ventana t_max se
+    calcula a partir de df[window_column] (el minuto del evento VAR).
+
+    match_lookup: lookup de partidos o GoalIndex (ver match.events).
+    """
+    if len(df) == 0:
+        return pd.DataFrame()
+
+    goal_index = as_goal_index(match_lookup)
+
+    window_minute = df[window_column].to_numpy()
+    t_max = np.minimum(MAX_ANALYSIS_WINDOW, MATCH_END_MINUTE - window_minute)
+
+    keep = (window_minute >= min_minute) & (t_max > 0)
+    df = df[keep]
+
+    t_event, occurred = goal_index.time_to_concede_many(
+        df["match_id"].to_numpy(),
+        df["minute"].to_numpy(),
+        df["team"].to_numpy(),
+        t_max[keep]
+    )
+
+    return pd.DataFrame({
+        "group": group,
+        "state": df["state"].to_numpy(),
+        "t_event": t_event,
+        "event_occurred": occurred
+    })
 
 def build_var_analysis(df_var, match_lookup, min_minute=MIN_ANALYSIS_MINUTE):
-    analysis_rows = []
-
-    for _, row in df_var.iterrows():
-        minute = row["minute"]
-        if minute < min_minute:
-            continue
-
-        t_max = min(MAX_ANALYSIS_WINDOW, MATCH_END_MINUTE - minute)
-        if t_max <= 0:
-            continue
-
-        match = match_lookup[row["match_id"]]
-        events = match["events"]
-
-        t_event, occurred = time_to_concede(
-            events,
-            minute,
-            row["team"],
-            t_max
-        )
-
-        analysis_rows.append({
-            "group": VAR_GROUP,
-            "state": row["state"],
-            "t_event": t_event,
-            "event_occurred": occurred
-        })
-
-    return pd.DataFrame(analysis_rows)
+    return concede_analysis(df_var, match_lookup, VAR_GROUP, "minute", min_minute)
 
 def build_control_analysis(df_control, match_lookup, min_minute=MIN_ANALYSIS_MINUTE):
-    analysis_rows = []
-
-    for _, row in df_control.iterrows():
-        minute = row["minute"]
-        var_minute = row["var_minute"]
-
-        if var_minute < min_minute:
+    return concede_analysis(df_control, match_lookup, CONTROL_GROUP, "var_minute", min_minute)
+
+def ensemble_draws(seeds, windows, pair_offsets, pair_hits, pair_keep, event_state, states, n_controls):
+    """
+    Bloque de sorteos del ensemble (se ejecuta en los procesos del pool).
+    Por cada semilla, controles y controles que encajan por estado.
+    """
+    rows = []
+
+    for seed in seeds:
+        draws = draw_controls(windows, n_controls, np.random.default_rng(seed))
+        if not draws:
             continue
 
-        t_max = min(MAX_ANALYSIS_WINDOW, MATCH_END_MINUTE - var_minute)
-        if t_max <= 0:
-            continue
-
-        match = match_lookup[row["match_id"]]
-        events = match["events"]
-
-        t_event, occurred = time_to_concede(
-            events,
-            minute,
-            row["team"],
-            t_max
-        )
-
-        analysis_rows.append({
-            "group": CONTROL_GROUP,
-            "state": row["state"],
-            "t_event": t_event,
-            "event_occurred": occurred
-        })
-
-    return pd.DataFrame(analysis_rows)
+        pairs = np.concatenate([pair_offsets[i] + chosen for i, chosen in draws.items()])
+        pairs = pairs[pair_keep[pairs]]
+        codes = event_state[np.searchsorted(pair_offsets, pairs, side="right") - 1]
+
+        n = np.bincount(codes, minlength=len(states))
+        hits = np.bincount(codes, weights=pair_hits[pairs], minlength=len(states))
+
+        for k, state in enumerate(states):
+            rows.append({"seed": seed, "state": state, "n": int(n[k]), "hits": int(hits[k])})
+
+    return rows
+
+def control_ensemble(df_var, df_control_candidates, match_lookup, BIN, seeds,
+                     n_controls=DEFAULT_N_CONTROLS, horizon=MAX_ANALYSIS_WINDOW,
+                     min_minute=MIN_ANALYSIS_MINUTE, jobs=DEFAULT_JOBS):
+    """
+    Repite match_controls + build_control_analysis para varias semillas
+    y resume, por sorteo y estado, la probabilidad de encajar en
+    horizon minutos (la de interaction_plot_by_state).
+
+    Las ventanas de candidatos y el tiempo hasta encajar de cada par
+    (evento VAR, candidato) se calculan una sola vez; cada sorteo solo
+    elige posiciones, así que cuesta milisegundos. El sorteo con semilla s
+    es el mismo que match_controls(..., seed=s).
+
+    df_control_candidates: tabla de candidatos o ControlIndex.
+    match_lookup: lookup de partidos o GoalIndex.
+    seeds: semillas de los sorteos (p.ej. range(1000)).
+
+    Devuelve un DataFrame con columnas:
+    - seed, state
+    - n: controles del sorteo en ese estado
+    - p_control: proporción de controles que encajan en <= horizon
+    - p_var: lo mismo para los eventos VAR (no depende del sorteo)
+    - diff: p_var - p_control
+    """
+    index = as_control_index(df_control_candidates)
+    goal_index = as_goal_index(match_lookup)
+    windows = control_windows(df_var, index, BIN)
+
+    # ventana t_max de cada evento VAR, como en concede_analysis
+    var_minutes = df_var["minute"].to_numpy()
+    t_max = np.minimum(MAX_ANALYSIS_WINDOW, MATCH_END_MINUTE - var_minutes)
+    event_keep = (var_minutes >= min_minute) & (t_max > 0)
+
+    states, event_state = np.unique(df_var["state"].to_numpy(dtype=str), return_inverse=True)
+    states = states.tolist()
+
+    # todos los pares (evento VAR, candidato de su ventana)
+    sizes = np.array([len(w) for w in windows], dtype=np.int64)
+    pair_offsets = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+    pair_event = np.repeat(np.arange(len(windows)), sizes)
+    positions = np.concatenate(windows + [np.zeros(0, dtype=np.int64)])
+
+    candidates = index.candidates
+    t_event, occurred = goal_index.time_to_concede_many(
+        candidates["match_id"].to_numpy()[positions],
+        candidates["minute"].to_numpy()[positions],
+        candidates["team"].to_numpy()[positions],
+        t_max[pair_event]
+    )
+    pair_hits = (occurred == 1) & (t_event <= horizon)
+    pair_keep = event_keep[pair_event]
+
+    seeds = list(seeds)
+    chunks = [seeds[i:i + RESAMPLE_CHUNK] for i in range(0, len(seeds), RESAMPLE_CHUNK)]
+
+    rows = parallel_map(
+        partial(
+            ensemble_draws, windows=windows, pair_offsets=pair_offsets,
+            pair_hits=pair_hits, pair_keep=pair_keep, event_state=event_state,
+            states=states, n_controls=n_controls
+        ),
+        chunks,
+        jobs=jobs
+    )
+    df_ensemble = pd.DataFrame([row for chunk in rows for row in chunk])
+
+    if len(df_ensemble) == 0:
+        return df_ensemble
+
+    df_var_analysis = build_var_analysis(df_var, goal_index, min_minute)
+    p_var = (
+        (df_var_analysis["event_occurred"] == 1) & (df_var_analysis["t_event"] <= horizon)
+    ).groupby(df_var_analysis["state"]).mean()
+
+    df_ensemble["p_control"] = df_ensemble["hits"] / df_ensemble["n"].replace(0, np.nan)
+    df_ensemble["p_var"] = df_ensemble["state"].map(p_var)
+    df_ensemble["diff"] = df_ensemble["p_var"] - df_ensemble["p_control"]
+
+    return df_ensemble.drop(columns="hits")
 
 def cumulative_goal_curve(df, max_t):
     times = np.arange(0, max_t + 1)
-    cumulative_prob = []
 
     N = len(df)
 
-    for t in times:
-        events_occurred = df[
-            (df["event_occurred"] == 1) &
-            (df["t_event"] <= t)
-        ]
-
-        cumulative_prob.append(len(events_occurred) / N)
+    # minutos de los goles encajados, ordenados una vez
+    t_goals = np.sort(df["t_event"].to_numpy()[df["event_occurred"].to_numpy() == 1])
+    cumulative_prob = (np.searchsorted(t_goals, times, side="right") / N).tolist()
 
     return times, cumulative_prob
 
-def build_cumulative_curves(df_analysis, max_t=MAX_ANALYSIS_WINDOW):
+def km_cumulative_incidence(codes, n_groups, t_event, event_occurred, max_t):
+    """
+    1 - Kaplan-Meier para varios grupos a la vez.
+
+    codes: grupo (0..n_groups-1) de cada fila.
+    t_event, event_occurred: como en build_var_analysis; una fila con
+        event_occurred == 0 está censurada en t_event (su t_max), así que
+        deja de contar como en riesgo a partir de ahí en vez de contar
+        como "no encaja" en todos los minutos posteriores.
+
+    Devuelve un array (n_groups, max_t + 1) con P(encajar en <= t).
+    """
+    n_times = max_t + 2
+    t = np.clip(np.asarray(t_event, dtype=np.int64), 0, max_t + 1)
+    occurred = np.asarray(event_occurred) == 1
+    slot = np.asarray(codes, dtype=np.int64) * n_times + t
+
+    events = np.bincount(slot[occurred], minlength=n_groups * n_times).reshape(n_groups, n_times)
+    exits = np.bincount(slot, minlength=n_groups * n_times).reshape(n_groups, n_times)
+
+    # en riesgo en t: filas que no han salido antes de t
+    at_risk = exits.sum(axis=1, keepdims=True) - np.cumsum(exits, axis=1) + exits
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        hazard = np.where(at_risk > 0, events / at_risk, 0.0)
+
+    survival = np.cumprod(1 - hazard[:, :max_t + 1], axis=1)
+
+    return 1 - survival
+
+def naive_cumulative_incidence(codes, n_groups, t_event, event_occurred, max_t):
+    """
+    Versión por grupos de cumulative_goal_curve: proporción de filas de
+    cada grupo que encajan en <= t, sin tener en cuenta la censura.
+    """
+    n_times = max_t + 2
+    t = np.clip(np.asarray(t_event, dtype=np.int64), 0, max_t + 1)
+    occurred = np.asarray(event_occurred) == 1
+    codes = np.asarray(codes, dtype=np.int64)
+
+    events = np.bincount(codes[occurred] * n_times + t[occurred], minlength=n_groups * n_times)
+    events = events.reshape(n_groups, n_times)[:, :max_t + 1]
+    sizes = np.bincount(codes, minlength=n_groups)[:, None]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.cumsum(events, axis=1) / sizes
+
+def cumulative_incidence(codes, n_groups, t_event, event_occurred, max_t, censored=False):
+    if censored:
+        return km_cumulative_incidence(codes, n_groups, t_event, event_occurred, max_t)
+    return naive_cumulative_incidence(codes, n_groups, t_event, event_occurred, max_t)
+
+def survival_curves(df, max_t=MAX_ANALYSIS_WINDOW, by="group"):
+    """
+    Curvas acumuladas de probabilidad de encajar con censura
+    (ver km_cumulative_incidence) para todos los estratos en una llamada.
+
+    by: columna o lista de columnas que definen los estratos.
+    Devuelve {estrato: (times, cumulative_prob)}.
+    """
+    times = np.arange(0, max_t + 1)
+
+    codes, strata = pd.factorize(
+        df[by] if isinstance(by, str) else pd.MultiIndex.from_frame(df[list(by)])
+    )
+
+    incidence = km_cumulative_incidence(
+        codes,
+        len(strata),
+        df["t_event"].to_numpy(),
+        df["event_occurred"].to_numpy(),
+        max_t
+    )
+
+    return {
+        stratum: (times, incidence[i])
+        for i, stratum in enumerate(strata)
+    }
+
+def build_cumulative_curves(df_analysis, max_t=MAX_ANALYSIS_WINDOW, censored=False):
+    """
+    Curvas de VAR y CONTROL.
+
+    censored: False = proporción simple (cumulative_goal_curve, la de las
+    figuras del informe); True = Kaplan-Meier teniendo en cuenta las filas
+    censuradas por t_max (survival_curves).
+    """
+    if censored:
+        curves = survival_curves(df_analysis, max_t)
+        return {group: curves[group] for group in [VAR_GROUP, CONTROL_GROUP] if group in curves}
+
     curves = {}
 
     for group in [VAR_GROUP, CONTROL_GROUP]:
@@ -239,3 +590,130 @@ def build_cumulative_curves(df_analysis, max_t=MAX_ANALYSIS_WINDOW):
 
     return curves
 
+def resample_curves(task, codes, n_groups, t_event, event_occurred, max_t, censored):
+    """
+    Un bloque de réplicas (se ejecuta en los procesos del pool).
+
+    task: (seed, n_rep, permute). Con permute=False es un bootstrap
+    dentro de cada grupo; con permute=True se barajan las etiquetas de
+    grupo entre todas las filas. Devuelve (n_rep, n_groups, max_t + 1).
+    """
+    seed, n_rep, permute = task
+    rng = np.random.default_rng(seed)
+    n_rows = len(codes)
+
+    if permute:
+        rows = np.broadcast_to(np.arange(n_rows), (n_rep, n_rows))
+        labels = rng.permuted(np.broadcast_to(codes, (n_rep, n_rows)), axis=1)
+    else:
+        rows = np.concatenate([
+            members[rng.integers(0, len(members), size=(n_rep, len(members)))]
+            for members in (np.flatnonzero(codes == g) for g in range(n_groups))
+        ], axis=1)
+        labels = codes[rows]
+
+    # cada réplica es un bloque de grupos: todas se calculan en una llamada
+    replicate_codes = labels + n_groups * np.arange(n_rep)[:, None]
+
+    curves = cumulative_incidence(
+        replicate_codes.ravel(),
+        n_rep * n_groups,
+        t_event[rows].ravel(),
+        event_occurred[rows].ravel(),
+        max_t,
+        censored
+    )
+
+    return curves.reshape(n_rep, n_groups, max_t + 1)
+
+def resampling_tasks(seed_sequence, n_total, permute):
+    """
+    Bloques de RESAMPLE_CHUNK réplicas con semillas hijas de seed_sequence.
+    Los bloques (y sus semillas) no dependen del número de procesos.
+    """
+    n_chunks = -(-n_total // RESAMPLE_CHUNK)
+    if n_chunks == 0:
+        return []
+
+    sizes = [RESAMPLE_CHUNK] * (n_chunks - 1) + [n_total - RESAMPLE_CHUNK * (n_chunks - 1)]
+
+    return [
+        (child, size, permute)
+        for child, size in zip(seed_sequence.spawn(n_chunks), sizes)
+    ]
+
+def bootstrap_concede_curves(df_analysis, n_boot=DEFAULT_N_RESAMPLES, n_perm=DEFAULT_N_RESAMPLES,
+                             max_t=MAX_ANALYSIS_WINDOW, by="group", alpha=0.05,
+                             censored=False, seed=CONTROL_RANDOM_SEED, jobs=DEFAULT_JOBS):
+    """
+    Bandas de confianza bootstrap de las curvas de encajar y test de
+    permutación de la diferencia VAR vs CONTROL.
+
+    by: estratos de las curvas ("group", o p.ej. ["state", "group"]);
+        el bootstrap remuestrea dentro de cada estrato.
+    censored: usar Kaplan-Meier (ver survival_curves) en vez de la
+        proporción simple de cumulative_goal_curve.
+    seed: las semillas de cada bloque salen de np.random.SeedSequence(seed)
+        con spawn, así el resultado es el mismo con cualquier jobs.
+
+    Devuelve un dict con:
+    - times
+    - curves: {estrato: curva observada}
+    - bands: {estrato: (inferior, superior)} al nivel 1 - alpha
+      (vacío si n_boot=0)
+    - p_value: P(max_t |VAR - CONTROL| >= observado) bajo permutación
+      (NaN si n_perm=0)
+    """
+    times = np.arange(0, max_t + 1)
+    t_event = df_analysis["t_event"].to_numpy()
+    event_occurred = df_analysis["event_occurred"].to_numpy()
+
+    codes, strata = pd.factorize(
+        df_analysis[by] if isinstance(by, str) else pd.MultiIndex.from_frame(df_analysis[list(by)])
+    )
+    observed = cumulative_incidence(codes, len(strata), t_event, event_occurred, max_t, censored)
+
+    # contraste VAR (0) vs CONTROL (1) sobre todas las filas
+    group_codes = np.where(df_analysis["group"].to_numpy() == VAR_GROUP, 0, 1)
+    pooled = cumulative_incidence(group_codes, 2, t_event, event_occurred, max_t, censored)
+    statistic = np.nanmax(np.abs(pooled[0] - pooled[1]))
+
+    boot_seed, perm_seed = np.random.SeedSequence(seed).spawn(2)
+
+    boot = parallel_map(
+        partial(
+            resample_curves, codes=codes, n_groups=len(strata), t_event=t_event,
+            event_occurred=event_occurred, max_t=max_t, censored=censored
+        ),
+        resampling_tasks(boot_seed, n_boot, permute=False),
+        jobs=jobs
+    )
+    perm = parallel_map(
+        partial(
+            resample_curves, codes=group_codes, n_groups=2, t_event=t_event,
+            event_occurred=event_occurred, max_t=max_t, censored=censored
+        ),
+        resampling_tasks(perm_seed, n_perm, permute=True),
+        jobs=jobs
+    )
+
+    # con n_boot=0 no hay bandas
+    bands = {}
+    if boot:
+        boot = np.concatenate(boot)
+        lower, upper = np.nanquantile(boot, [alpha / 2, 1 - alpha / 2], axis=0)
+        bands = {stratum: (lower[i], upper[i]) for i, stratum in enumerate(strata)}
+
+    # con n_perm=0 no se hace el test
+    p_value = np.nan
+    if perm:
+        perm = np.concatenate(perm)
+        perm_statistic = np.nanmax(np.abs(perm[:, 0] - perm[:, 1]), axis=1)
+        p_value = (1 + np.count_nonzero(perm_statistic >= statistic)) / (1 + len(perm_statistic))
+
+    return {
+        "times": times,
+        "curves": {stratum: observed[i] for i, stratum in enumerate(strata)},
+        "bands": bands,
+        "p_value": p_value
+    }
@@ -2,6 +2,11 @@ from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent
 DATA_DIR = BASE_DIR / "data"
+CACHE_DIR = BASE_DIR / ".cache"
+COLUMNAR_CACHE_DIR = CACHE_DIR / "columnar"
+SHARED_STORE_PATH = CACHE_DIR / "seasons.bin"
+
+SEASON_FILE_PATTERN = "season_*.json"
 
 HOME_TEAM = "home"
 AWAY_TEAM = "away"
@@ -12,6 +17,9 @@ MATCH_START_MINUTE = 1
 MATCH_END_MINUTE = 90
 MATCH_MAX_MINUTE_ITER = 97
 
+# Minutos (0..N-1) del tensor de estado por partido
+STATE_TENSOR_MINUTES = 121
+
 DEFAULT_BIN = 2
 DEFAULT_N_CONTROLS = 5
 
@@ -20,9 +28,23 @@ MAX_ANALYSIS_WINDOW = 15
 
 CONTROL_RANDOM_SEED = 42
 
+# Réplicas bootstrap/permutación y tamaño de cada bloque enviado al pool
+DEFAULT_N_RESAMPLES = 2000
+RESAMPLE_CHUNK = 250
+
+# Sorteos de control del modo ensemble (ver control_ensemble)
+DEFAULT_N_ENSEMBLE = 1000
+
+# Memoria máxima (bytes) de las temporadas columnares en un SeasonCatalog
+CATALOG_MAX_BYTES = 512 * 1024 ** 2
+
+# Procesos para el map/reduce por temporada (1 = en serie)
+DEFAULT_JOBS = 1
+
 GOLEADA_THRESHOLD = 3
 
 VAR_GROUP = "VAR"
+EVENT_GROUP = "EVENT"
 CONTROL_GROUP = "CONTROL"
 
 STATE_WINNING = "winning"
@@ -36,6 +58,8 @@ YELLOW_CARD_EVENT = "Yellow card"
 RED_CARD_EVENT = "Red card"
 SECOND_YELLOW_RED_EVENT = "2nd yellow card leads to red card"
 VAR_EVENT_TYPE = "Goal disallowed by VAR"
+SUB_ON_EVENT = "Comes on"
+SUB_OFF_EVENT = "Goes off"
 
 GOAL_EVENTS = {
     GOAL_EVENT,
@@ -54,4 +78,81 @@ RED_EVENTS = {
     SECOND_YELLOW_RED_EVENT
 }
 
+# Eventos que descartan un minuto como control en el análisis VAR
+RELEVANT_EVENTS = {
+    GOAL_EVENT,
+    PENALTI_GOAL_EVENT,
+    OWN_GOAL_EVENT,
+    "Goal disallowed",
+    VAR_EVENT_TYPE,
+    RED_CARD_EVENT,
+    SECOND_YELLOW_RED_EVENT,
+    "Missed penalty",
+    "Penalty saved"
+}
+
+# Vocabulario de tipos de evento: el código de cada tipo es su posición.
+# Los tipos que no estén aquí se añaden al final del vocabulario de cada
+# temporada (ver data_io.loader.columnarize_season).
+EVENT_TYPES = [
+    SUB_OFF_EVENT,
+    SUB_ON_EVENT,
+    YELLOW_CARD_EVENT,
+    GOAL_EVENT,
+    "Assist",
+    PENALTI_GOAL_EVENT,
+    "Injury",
+    "Shot which hits the post",
+    SECOND_YELLOW_RED_EVENT,
+    RED_CARD_EVENT,
+    "Missed penalty",
+    "Goal disallowed",
+    OWN_GOAL_EVENT,
+    "Penalty saved",
+    "Free-kick goal",
+    "Conceded penalties",
+    VAR_EVENT_TYPE,
+    "Yellow card rescinded",
+    "Man of the match",
+    "Controversial incident",
+    "Red card rescinded"
+]
+EVENT_CODES = {event_type: code for code, event_type in enumerate(EVENT_TYPES)}
+
+# Categorías de evento como bits: category & GOAL_BIT != 0, etc.
+GOAL_BIT = 1
+OWN_GOAL_BIT = 2
+CARD_BIT = 4
+RED_BIT = 8
+VAR_RELEVANT_BIT = 16
+
+EVENT_CATEGORIES = {
+    event_type: (
+        GOAL_BIT * (event_type in GOAL_EVENTS)
+        | OWN_GOAL_BIT * (event_type == OWN_GOAL_EVENT)
+        | CARD_BIT * (event_type in CARD_EVENTS)
+        | RED_BIT * (event_type in RED_EVENTS)
+        | VAR_RELEVANT_BIT * (event_type in RELEVANT_EVENTS)
+    )
+    for event_type in EVENT_TYPES
+}
+
+TEAM_CODES = {
+    HOME_TEAM: 0,
+    AWAY_TEAM: 1
+}
 
+# Estudios de eventos (ver analysis/event_study.py)
+EVENT_STUDY_TRIGGERS = [
+    VAR_EVENT_TYPE,
+    RED_CARD_EVENT,
+    "Missed penalty",
+    "Penalty saved",
+    "Goal disallowed",
+    "Shot which hits the post",
+    "Injury"
+]
+
+EVENT_STUDY_OUTCOMES = {
+    "concede": GOAL_EVENTS
+}
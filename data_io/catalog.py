@@ -0,0 +1,118 @@
+import os
+from collections import OrderedDict
+
+from config import CATALOG_MAX_BYTES
+from data_io.loader import COLUMNAR_TABLES, load_season_columnar, season_match_objects
+
+
+def columnar_nbytes(season):
+    """
+    Bytes de los arrays de una temporada columnar.
+    """
+    return season["event_offsets"].nbytes + sum(
+        values.nbytes
+        for table in COLUMNAR_TABLES
+        for values in season[table].values()
+    )
+
+
+class SeasonCatalog:
+    """
+    Temporadas columnares compartidas dentro de un proceso.
+
+    Cada fichero se carga una sola vez (load_season_columnar) y se guarda
+    mientras quepa en max_bytes (suma de los nbytes de sus arrays); al
+    pasarse del presupuesto se descartan las temporadas usadas hace más
+    tiempo (LRU).
+
+    Se puede pasar a cualquier build_* de analysis en lugar de la lista de
+    ficheros. Al enviarse a otros procesos viaja vacío: cada proceso
+    rellena su propia caché.
+
+    store: SharedSeasonStore opcional (ver data_io.shared). Si se indica,
+    las temporadas columnares salen de su fichero mapeado en memoria,
+    compartido entre procesos en lugar de cargarse en cada uno.
+    """
+
+    def __init__(self, season_files, max_bytes=CATALOG_MAX_BYTES, store=None):
+        self.season_files = list(season_files)
+        self.max_bytes = max_bytes
+        self.store = store
+        self._seasons = OrderedDict()
+        self._nbytes = 0
+
+    def __iter__(self):
+        return iter(self.season_files)
+
+    def __len__(self):
+        return len(self.season_files)
+
+    def __getstate__(self):
+        return {
+            "season_files": self.season_files,
+            "max_bytes": self.max_bytes,
+            "store": self.store
+        }
+
+    def __setstate__(self, state):
+        self.__init__(state["season_files"], state["max_bytes"], state["store"])
+
+    @property
+    def nbytes(self):
+        return self._nbytes
+
+    def columnar(self, season_file):
+        """
+        load_season_columnar con la caché LRU del catálogo, o la vista del
+        store si lo hay (no ocupa memoria del proceso y no cuenta).
+        """
+        if self.store is not None:
+            return self.store.columnar(season_file)
+
+        key = os.fspath(season_file)
+
+        if key in self._seasons:
+            self._seasons.move_to_end(key)
+            return self._seasons[key][0]
+
+        season = load_season_columnar(season_file)
+        nbytes = columnar_nbytes(season)
+
+        self._seasons[key] = (season, nbytes)
+        self._nbytes += nbytes
+
+        # la temporada recién leída se queda aunque ella sola no quepa
+        while self._nbytes > self.max_bytes and len(self._seasons) > 1:
+            _, (_, evicted) = self._seasons.popitem(last=False)
+            self._nbytes -= evicted
+
+        return season
+
+    def match_lookup(self):
+        """
+        {match_id: Match} como data_io.loader.build_match_lookup, sobre
+        las temporadas columnares del catálogo.
+        """
+        return {
+            match.id: match
+            for season_file in self.season_files
+            for match in season_match_objects(self.columnar(season_file))
+        }
+
+
+def resolve_seasons(seasons):
+    """
+    Devuelve (season_files, catalog) para una lista de ficheros
+    o un SeasonCatalog (catalog es None en el primer caso).
+    """
+    if isinstance(seasons, SeasonCatalog):
+        return seasons.season_files, seasons
+
+    return list(seasons), None
+
+
+def season_columnar(season_file, catalog=None):
+    if catalog is None:
+        return load_season_columnar(season_file)
+
+    return catalog.columnar(season_file)
@@ -1,18 +1,640 @@
+import hashlib
 import json
+import os
+import shutil
+
+import numpy as np
+
+from config import COLUMNAR_CACHE_DIR, HOME_TEAM, AWAY_TEAM, TEAM_CODES, EVENT_TYPES, EVENT_CATEGORIES
+
+# Versión del formato columnar; cambiarla invalida todas las cachés
+COLUMNAR_VERSION = 2
+
+# Tamaño de bloque (caracteres) de la lectura incremental de JSON
+STREAM_CHUNK_SIZE = 1 << 16
+
+COLUMNAR_TABLES = ("matches", "events", "players", "lineups")
+
 
 def load_season(filepath):
     with open(filepath, "r", encoding="utf-8") as f:
         return json.load(f)
 
 
+class _JsonStream:
+    """
+    Lector incremental mínimo para recorrer un JSON grande sin cargarlo
+    entero: solo decodifica (raw_decode) los valores que se piden.
+    """
+
+    def __init__(self, f, chunk_size=STREAM_CHUNK_SIZE):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self):
+        if self.eof:
+            return False
+
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+
+        # descartar lo ya consumido para que el buffer no crezca
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                raise ValueError("JSON truncado")
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"Se esperaba {char!r} en el JSON")
+        self.pos += 1
+
+    def read_value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+
+            # un número al final del buffer puede estar cortado
+            if end == len(self.buf) and self._fill():
+                continue
+
+            self.pos = end
+            return value
+
+    def skip_value(self):
+        # los contenedores se descartan elemento a elemento, así nunca se
+        # materializa más de un hijo (p.ej. una jornada) a la vez
+        char = self.peek()
+        if char == "[":
+            for _ in self.iter_array():
+                self.read_value()
+        elif char == "{":
+            for _ in self.iter_object():
+                self.read_value()
+        else:
+            self.read_value()
+
+    def iter_object(self):
+        """
+        Recorre las claves de un objeto; tras cada clave el llamante debe
+        consumir el valor (read_value o skip_value).
+        """
+        self.expect("{")
+        first = True
+        while True:
+            if self.peek() == "}":
+                self.pos += 1
+                return
+            if not first:
+                self.expect(",")
+            first = False
+
+            key = self.read_value()
+            self.expect(":")
+            yield key
+
+    def iter_array(self):
+        """
+        Recorre los elementos de un array; el llamante consume cada uno.
+        """
+        self.expect("[")
+        first = True
+        while True:
+            if self.peek() == "]":
+                self.pos += 1
+                return
+            if not first:
+                self.expect(",")
+            first = False
+
+            yield
+
+
+def select_fields(match, fields, extra):
+    """
+    Dict con los campos fields del partido (todos si es None); los de
+    extra (p.ej. season_id) tienen prioridad sobre los del partido.
+    """
+    if fields is None:
+        return {**match, **extra}
+
+    return {
+        field: extra[field] if field in extra else match[field]
+        for field in fields
+    }
+
+
+def iter_matches(season_files, fields=None):
+    """
+    Genera los partidos de las temporadas de uno en uno, leyendo cada
+    fichero de forma incremental. Solo hay un partido en memoria a la vez.
+
+    fields: campos del partido a devolver (None = todos). Además de los
+    campos del JSON admite "season_id" y "round" (número de jornada).
+    Se asume que season_id aparece antes que rounds, como en data/.
+    """
+    for season_file in season_files:
+        with open(season_file, "r", encoding="utf-8") as f:
+            stream = _JsonStream(f)
+            extra = {"season_id": None, "round": None}
+
+            for key in stream.iter_object():
+                if key == "season_id":
+                    extra["season_id"] = stream.read_value()
+                    continue
+                if key != "rounds":
+                    stream.skip_value()
+                    continue
+
+                for _ in stream.iter_array():
+                    for round_key in stream.iter_object():
+                        if round_key == "number":
+                            extra["round"] = stream.read_value()
+                        elif round_key == "matches":
+                            for _ in stream.iter_array():
+                                yield select_fields(
+                                    stream.read_value(), fields, extra
+                                )
+                        else:
+                            stream.skip_value()
+
+
+EVENT_DTYPE = np.dtype([
+    ("minute", np.int16),
+    ("team", np.int8),
+    ("type", np.int16),
+    ("player", np.int32)
+])
+
+
+def season_event_records(season):
+    """
+    Eventos de una temporada columnar como un único array estructurado
+    (EVENT_DTYPE), creado una vez y guardado en season["event_records"].
+    """
+    if "event_records" not in season:
+        events = season["events"]
+        records = np.empty(len(events["type"]), dtype=EVENT_DTYPE)
+        for column in EVENT_DTYPE.names:
+            records[column] = events[column]
+        season["event_records"] = records
+
+    return season["event_records"]
+
+
+class Match:
+    """
+    Partido respaldado por los arrays de su temporada columnar: solo
+    guarda la temporada y su posición, y cada campo se lee bajo demanda.
+
+    - events: lista de dicts como la de load_season (tipos y equipos como
+      texto), para las funciones de un partido (time_to_concede,
+      MatchTimeline...)
+    - event_array: vista del array estructurado de la temporada
+      (EVENT_DTYPE), type indexa season["event_types"] y player
+      season["players"]["href"]
+    - home_lineup, away_lineup, home_bench, away_bench: índices de jugador
+    - match["campo"] equivale a match.campo
+    """
+
+    __slots__ = ("season", "index")
+
+    def __init__(self, season, index):
+        self.season = season
+        self.index = index
+
+    def __getitem__(self, field):
+        return getattr(self, field)
+
+    def __repr__(self):
+        return f"Match({self.id!r})"
+
+    def _column(self, column):
+        return self.season["matches"][column][self.index].item()
+
+    @property
+    def id(self):
+        return self._column("id")
+
+    @property
+    def season_id(self):
+        return self.season["season_id"]
+
+    @property
+    def round(self):
+        return self._column("round")
+
+    @property
+    def home_team(self):
+        return self._column("home_team")
+
+    @property
+    def away_team(self):
+        return self._column("away_team")
+
+    @property
+    def result(self):
+        return [self._column("home_goals"), self._column("away_goals")]
+
+    @property
+    def date_time(self):
+        return self._column("date_time")
+
+    @property
+    def referee(self):
+        return self._column("referee")
+
+    @property
+    def event_types(self):
+        return self.season["event_types"]
+
+    @property
+    def event_array(self):
+        offsets = self.season["event_offsets"]
+        return season_event_records(self.season)[offsets[self.index]:offsets[self.index + 1]]
+
+    @property
+    def events(self):
+        event_types = self.season["event_types"]
+        hrefs = self.season["players"]["href"]
+        teams = {code: team for team, code in TEAM_CODES.items()}
+
+        return [
+            {
+                "player": hrefs[player].item() if player >= 0 else None,
+                "team": teams[team],
+                "minute": int(minute),
+                "type": event_types[event_type]
+            }
+            for minute, team, event_type, player in self.event_array.tolist()
+        ]
+
+    def _lineup(self, team, starter):
+        lineups = self.season["lineups"]
+        lo, hi = np.searchsorted(lineups["match"], [self.index, self.index + 1])
+
+        rows = slice(lo, hi)
+        mask = (lineups["team"][rows] == TEAM_CODES[team]) & (lineups["starter"][rows] == starter)
+
+        return lineups["player"][rows][mask]
+
+    @property
+    def home_lineup(self):
+        return self._lineup(HOME_TEAM, True)
+
+    @property
+    def away_lineup(self):
+        return self._lineup(AWAY_TEAM, True)
+
+    @property
+    def home_bench(self):
+        return self._lineup(HOME_TEAM, False)
+
+    @property
+    def away_bench(self):
+        return self._lineup(AWAY_TEAM, False)
+
+
+def season_match_objects(season):
+    return [Match(season, i) for i in range(len(season["matches"]["id"]))]
+
 def build_match_lookup(season_files):
+    """
+    {match_id: Match} de todas las temporadas, sobre sus arrays columnares
+    (ver load_season_columnar).
+    """
     lookup = {}
 
     for season_file in season_files:
-        season_data = load_season(season_file)
+        for match in season_match_objects(load_season_columnar(season_file)):
+            lookup[match.id] = match
+
+    return lookup
+
+
+def file_sha1(filepath, chunk_size=1 << 20):
+    digest = hashlib.sha1()
+
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def event_categories(event_types):
+    """
+    Bits de categoría (config.EVENT_CATEGORIES) de cada tipo de un
+    vocabulario, para filtrar eventos con season["event_categories"][types] & BIT.
+    """
+    return np.array(
+        [EVENT_CATEGORIES.get(event_type, 0) for event_type in event_types],
+        dtype=np.uint8
+    )
+
+def event_type_mask(season, event_types):
+    """
+    Máscara de los eventos de una temporada columnar cuyo tipo está en
+    event_types (para conjuntos de tipos sin bit de categoría propio).
+    """
+    codes = [
+        code for code, event_type in enumerate(season["event_types"])
+        if event_type in event_types
+    ]
+    return np.isin(season["events"]["type"], codes)
+
+
+def columnarize_season(season_data):
+    """
+    Convierte una temporada ya parseada en tablas de arrays NumPy planos.
+
+    Devuelve un dict con:
+    - season_id
+    - event_types: vocabulario de tipos de evento (events["type"] indexa
+      aquí): config.EVENT_TYPES más los tipos desconocidos de la temporada
+    - event_categories: bits de categoría de cada tipo (ver event_categories)
+    - matches: id, home_team, away_team, home_goals, away_goals,
+               date_time, date, referee, round
+    - events: match, minute, team (0 home, 1 away), type, player
+    - event_offsets: eventos del partido i en [offsets[i], offsets[i + 1])
+    - players: href, dob (NaT si falta), elo (NaN si falta)
+    - lineups: match, team, player, starter (titulares y suplentes)
+    """
+    player_index = {}
+    hrefs = []
+    dobs = []
+    elos = []
+
+    for p in season_data["players"]:
+        # igual que el dict {href: p}: la última aparición manda
+        if p["href"] in player_index:
+            idx = player_index[p["href"]]
+        else:
+            idx = len(hrefs)
+            player_index[p["href"]] = idx
+            hrefs.append(p["href"])
+            dobs.append(None)
+            elos.append(None)
+
+        dobs[idx] = p.get("dob") or None
+        elos[idx] = p.get("elo")
+
+    def player_code(href):
+        if href is None:
+            return -1
+        if href not in player_index:
+            player_index[href] = len(hrefs)
+            hrefs.append(href)
+            dobs.append(None)
+            elos.append(None)
+        return player_index[href]
+
+    event_types = {event_type: code for code, event_type in enumerate(EVENT_TYPES)}
+
+    matches = {
+        "id": [], "home_team": [], "away_team": [], "home_goals": [],
+        "away_goals": [], "date_time": [], "referee": [], "round": []
+    }
+    events = {"match": [], "minute": [], "team": [], "type": [], "player": []}
+    lineups = {"match": [], "team": [], "player": [], "starter": []}
+    event_offsets = [0]
+
+    for rnd in season_data["rounds"]:
+        for match in rnd["matches"]:
+            match_idx = len(matches["id"])
+
+            home_goals, away_goals = match["result"]
+            matches["id"].append(match["id"])
+            matches["home_team"].append(match["home_team"])
+            matches["away_team"].append(match["away_team"])
+            matches["home_goals"].append(home_goals)
+            matches["away_goals"].append(away_goals)
+            matches["date_time"].append(match["date_time"])
+            matches["referee"].append(match.get("referee") or "")
+            matches["round"].append(rnd["number"])
+
+            for e in match["events"] or []:
+                events["match"].append(match_idx)
+                events["minute"].append(e["minute"])
+                events["team"].append(TEAM_CODES[e["team"]])
+                events["type"].append(
+                    event_types.setdefault(e["type"], len(event_types))
+                )
+                events["player"].append(player_code(e.get("player")))
+            event_offsets.append(len(events["match"]))
+
+            for team, key, starter in [
+                (HOME_TEAM, "home_lineup", True),
+                (AWAY_TEAM, "away_lineup", True),
+                (HOME_TEAM, "home_bench", False),
+                (AWAY_TEAM, "away_bench", False),
+            ]:
+                for href in match.get(key) or []:
+                    lineups["match"].append(match_idx)
+                    lineups["team"].append(TEAM_CODES[team])
+                    lineups["player"].append(player_code(href))
+                    lineups["starter"].append(starter)
+
+    date_time = np.array(matches["date_time"], dtype=str)
+
+    return {
+        "season_id": season_data["season_id"],
+        "event_types": list(event_types),
+        "event_categories": event_categories(list(event_types)),
+        "matches": {
+            "id": np.array(matches["id"], dtype=str),
+            "home_team": np.array(matches["home_team"], dtype=str),
+            "away_team": np.array(matches["away_team"], dtype=str),
+            "home_goals": np.array(matches["home_goals"], dtype=np.int16),
+            "away_goals": np.array(matches["away_goals"], dtype=np.int16),
+            "date_time": date_time,
+            "date": date_time.astype("U10").astype("datetime64[D]"),
+            "referee": np.array(matches["referee"], dtype=str),
+            "round": np.array(matches["round"], dtype=str)
+        },
+        "events": {
+            "match": np.array(events["match"], dtype=np.int32),
+            "minute": np.array(events["minute"], dtype=np.int16),
+            "team": np.array(events["team"], dtype=np.int8),
+            "type": np.array(events["type"], dtype=np.int16),
+            "player": np.array(events["player"], dtype=np.int32)
+        },
+        "event_offsets": np.array(event_offsets, dtype=np.int64),
+        "players": {
+            "href": np.array(hrefs, dtype=str),
+            "dob": np.array(
+                [d if d else "NaT" for d in dobs], dtype="datetime64[D]"
+            ),
+            "elo": np.array(
+                [np.nan if e is None else e for e in elos], dtype=np.float64
+            )
+        },
+        "lineups": {
+            "match": np.array(lineups["match"], dtype=np.int32),
+            "team": np.array(lineups["team"], dtype=np.int8),
+            "player": np.array(lineups["player"], dtype=np.int32),
+            "starter": np.array(lineups["starter"], dtype=bool)
+        }
+    }
+
+
+def _columnar_cache_dir(filepath, cache_dir):
+    """
+    Un directorio por fichero fuente: nombre del fichero más un hash corto
+    de su ruta absoluta, para que dos temporadas con el mismo nombre en
+    directorios distintos no compartan caché.
+    """
+    source = os.path.abspath(filepath)
+    stem = os.path.splitext(os.path.basename(source))[0]
+    return cache_dir / f"{stem}-{hashlib.sha1(source.encode('utf-8')).hexdigest()[:12]}"
+
+
+def _read_columnar_meta(cache_path):
+    try:
+        with open(cache_path / "meta.json", "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_columnar_meta(cache_path, meta):
+    tmp_path = cache_path / f"meta.json.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, cache_path / "meta.json")
+
+
+def _columnar_cache_is_fresh(filepath, cache_path, meta):
+    """
+    La caché es válida si es del mismo fichero (ruta absoluta) y coincide
+    el tamaño y el mtime del JSON. Si solo cambia el mtime (p.ej. un
+    checkout) se compara el hash del contenido y, si es el mismo, se
+    reaprovecha actualizando el mtime guardado.
+    """
+    if meta is None or meta.get("version") != COLUMNAR_VERSION:
+        return False
+    if meta.get("source") != os.path.abspath(filepath):
+        return False
+
+    st = os.stat(filepath)
+    if meta["size"] != st.st_size:
+        return False
+    if meta["mtime_ns"] == st.st_mtime_ns:
+        return True
+
+    if file_sha1(filepath) != meta["sha1"]:
+        return False
+
+    meta["mtime_ns"] = st.st_mtime_ns
+    _write_columnar_meta(cache_path, meta)
+    return True
+
+
+def _write_columnar_cache(filepath, cache_path):
+    st = os.stat(filepath)
+    sha1 = file_sha1(filepath)
+    season = columnarize_season(load_season(filepath))
+
+    # se escribe en un directorio temporal propio del proceso y se pone en
+    # su sitio con os.replace: nunca se ve una caché a medio escribir
+    tmp_path = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.tmp")
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    tmp_path.mkdir(parents=True)
+
+    for table in COLUMNAR_TABLES:
+        for column, values in season[table].items():
+            np.save(tmp_path / f"{table}.{column}.npy", values)
+    np.save(tmp_path / "event_offsets.npy", season["event_offsets"])
+
+    _write_columnar_meta(tmp_path, {
+        "version": COLUMNAR_VERSION,
+        "source": os.path.abspath(filepath),
+        "size": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+        "sha1": sha1,
+        "season_id": season["season_id"],
+        "event_types": season["event_types"],
+        "columns": {
+            table: list(season[table]) for table in COLUMNAR_TABLES
+        }
+    })
+
+    # os.replace no sustituye un directorio con contenido: la caché
+    # anterior se aparta antes y se borra después
+    old_path = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.old")
+    try:
+        os.replace(cache_path, old_path)
+    except FileNotFoundError:
+        pass
+
+    try:
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        # otro proceso ha escrito la misma caché a la vez
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+    shutil.rmtree(old_path, ignore_errors=True)
+
+    return season
+
+
+def _read_columnar_cache(cache_path, meta, mmap_mode):
+    season = {
+        "season_id": meta["season_id"],
+        "event_types": meta["event_types"],
+        "event_categories": event_categories(meta["event_types"]),
+        "event_offsets": np.load(
+            cache_path / "event_offsets.npy", mmap_mode=mmap_mode
+        )
+    }
+
+    for table, columns in meta["columns"].items():
+        season[table] = {
+            column: np.load(
+                cache_path / f"{table}.{column}.npy", mmap_mode=mmap_mode
+            )
+            for column in columns
+        }
+
+    return season
+
+
+def load_season_columnar(filepath, cache_dir=COLUMNAR_CACHE_DIR, mmap_mode=None):
+    """
+    Versión columnar de load_season (ver columnarize_season).
+
+    La primera llamada parsea el JSON y guarda los arrays en cache_dir;
+    las siguientes solo leen .npy. La caché se reconstruye sola cuando el
+    fichero de la temporada cambia. Varios procesos pueden usarla a la vez:
+    si otro la sustituye mientras se lee, se vuelve a generar.
+    """
+    cache_path = _columnar_cache_dir(filepath, cache_dir)
+    meta = _read_columnar_meta(cache_path)
+
+    if not _columnar_cache_is_fresh(filepath, cache_path, meta):
+        return _write_columnar_cache(filepath, cache_path)
 
-        for rnd in season_data["rounds"]:
-            for match in rnd["matches"]:
-                lookup[match["id"]] = match
+    try:
+        return _read_columnar_cache(cache_path, meta, mmap_mode)
+    except FileNotFoundError:
+        return _write_columnar_cache(filepath, cache_path)
 
-    return lookup
\ No newline at end of file
@@ -0,0 +1,57 @@
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import chain
+
+import pandas as pd
+
+from config import DEFAULT_JOBS
+from data_io.catalog import resolve_seasons
+
+
+def parallel_map(func, items, jobs=DEFAULT_JOBS):
+    """
+    [func(item) for item in items] repartido en un ProcessPoolExecutor
+    cuando jobs > 1, siempre en el orden de items.
+    """
+    items = list(items)
+
+    if jobs is None or jobs <= 1 or len(items) <= 1:
+        return [func(item) for item in items]
+
+    with ProcessPoolExecutor(max_workers=min(jobs, len(items))) as pool:
+        return list(pool.map(func, items))
+
+
+def map_seasons(func, season_files, jobs=DEFAULT_JOBS, **kwargs):
+    """
+    Aplica func(season_file, **kwargs) a cada temporada.
+
+    season_files puede ser una lista de ficheros o un SeasonCatalog; en
+    ese caso func recibe además catalog=... para leer de él.
+
+    Con jobs > 1 reparte las temporadas en un ProcessPoolExecutor; los
+    resultados se devuelven siempre en el orden de season_files, así que
+    la salida es idéntica a la del camino en serie. func debe estar
+    definida a nivel de módulo para poder enviarse a los procesos.
+    """
+    season_files, catalog = resolve_seasons(season_files)
+    if catalog is not None:
+        kwargs["catalog"] = catalog
+
+    return parallel_map(partial(func, **kwargs), season_files, jobs=jobs)
+
+
+def concat_rows(partials):
+    return list(chain.from_iterable(partials))
+
+
+def concat_frames(partials):
+    return pd.concat(partials, ignore_index=True)
+
+
+def map_reduce_seasons(func, season_files, reduce=concat_rows, jobs=DEFAULT_JOBS, **kwargs):
+    """
+    map_seasons seguido de reduce(resultados). Por defecto concatena las
+    listas de filas de cada temporada en orden.
+    """
+    return reduce(map_seasons(func, season_files, jobs=jobs, **kwargs))
@@ -0,0 +1,98 @@
+import os
+import warnings
+
+from config import DATA_DIR, SEASON_FILE_PATTERN
+from data_io.loader import file_sha1
+
+
+def season_key(season_file):
+    """
+    "season_2018-19.json" -> "2018-19"
+    """
+    stem = os.path.splitext(os.path.basename(season_file))[0]
+    return stem.split("_", 1)[-1]
+
+
+def season_range(first, last):
+    """
+    Claves de temporada entre first y last (ambas incluidas),
+    p.ej. season_range("2018-19", "2020-21") -> ["2018-19", "2019-20", "2020-21"].
+    """
+    first_year = int(first[:4])
+    last_year = int(last[:4])
+
+    return [
+        f"{year}-{(year + 1) % 100:02d}"
+        for year in range(first_year, last_year + 1)
+    ]
+
+
+def discover_season_files(data_dir=DATA_DIR):
+    return sorted(data_dir.glob(SEASON_FILE_PATTERN), key=season_key)
+
+
+def canonical_season_files(season_files, strict=False):
+    """
+    Limpia una lista de ficheros de temporada manteniendo su orden:
+    - quita rutas repetidas y ficheros con el mismo contenido (sha1)
+    - avisa de los ficheros que no existen antes de empezar a trabajar
+      (con strict=True lanza FileNotFoundError)
+    """
+    canonical = []
+    seen_paths = set()
+    seen_hashes = {}
+    missing = []
+
+    for season_file in season_files:
+        path = os.path.realpath(season_file)
+        if path in seen_paths:
+            continue
+        seen_paths.add(path)
+
+        if not os.path.isfile(path):
+            missing.append(season_file)
+            continue
+
+        digest = file_sha1(path)
+        if digest in seen_hashes:
+            warnings.warn(
+                f"{season_file} tiene el mismo contenido que "
+                f"{seen_hashes[digest]}; se ignora",
+                stacklevel=2
+            )
+            continue
+        seen_hashes[digest] = season_file
+
+        canonical.append(season_file)
+
+    if missing:
+        message = "Faltan temporadas: " + ", ".join(
+            season_key(season_file) for season_file in missing
+        )
+        if strict:
+            raise FileNotFoundError(message)
+        warnings.warn(message, stacklevel=2)
+
+    return canonical
+
+
+def resolve_season_files(first=None, last=None, data_dir=DATA_DIR, strict=False):
+    """
+    Lista canónica y ordenada de ficheros de temporada.
+
+    Sin first/last devuelve todas las temporadas encontradas en data_dir;
+    con ellos, las de ese rango, informando de las que falten.
+    """
+    if first is None and last is None:
+        season_files = discover_season_files(data_dir)
+    else:
+        discovered = discover_season_files(data_dir)
+        first = first or season_key(discovered[0])
+        last = last or season_key(discovered[-1])
+
+        season_files = [
+            data_dir / SEASON_FILE_PATTERN.replace("*", key)
+            for key in season_range(first, last)
+        ]
+
+    return canonical_season_files(season_files, strict=strict)
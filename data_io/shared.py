@@ -0,0 +1,251 @@
+import json
+import os
+import time
+
+import numpy as np
+
+from config import SHARED_STORE_PATH, EVENT_TYPES, DATA_DIR
+from data_io.loader import COLUMNAR_TABLES, COLUMNAR_VERSION, load_season_columnar, event_categories
+from data_io.registry import discover_season_files
+
+# Alineación (bytes) de cada columna dentro del fichero
+SHARED_STORE_ALIGN = 64
+
+# Cabecera: firma, longitud (uint64) y meta en JSON
+SHARED_STORE_MAGIC = b"SEASONS\x01"
+SHARED_STORE_HEADER = len(SHARED_STORE_MAGIC) + 8
+
+
+def _aligned(offset):
+    return offset + (-offset % SHARED_STORE_ALIGN)
+
+
+def _file_fingerprint(season_file):
+    st = os.stat(season_file)
+    return {
+        "path": os.path.abspath(season_file),
+        "size": st.st_size,
+        "mtime_ns": st.st_mtime_ns
+    }
+
+
+def build_shared_store(season_files, path=SHARED_STORE_PATH):
+    """
+    Escribe las temporadas columnares (ver load_season_columnar) de todos
+    los ficheros en un único fichero binario de columnas de ancho fijo,
+    pensado para abrirse con np.memmap desde cualquier proceso.
+
+    Cada columna es la concatenación de la de todas las temporadas, con
+    los índices (partido, jugador) locales a su temporada: una temporada
+    es un tramo de filas de cada tabla y se lee sin copiar. Los tipos de
+    evento usan un vocabulario común (config.EVENT_TYPES más los tipos
+    desconocidos de cualquier temporada).
+
+    El fichero empieza con una cabecera (SHARED_STORE_MAGIC, longitud y
+    meta en JSON) con el dtype, forma y offset de cada columna (relativo al
+    primer byte de datos) y los tramos de cada temporada: datos y offsets
+    van en el mismo fichero y se sustituyen juntos con un solo os.replace.
+    """
+    seasons = [load_season_columnar(season_file) for season_file in season_files]
+
+    vocabulary = list(EVENT_TYPES)
+    for season in seasons:
+        vocabulary += [t for t in season["event_types"] if t not in vocabulary]
+    codes = {event_type: code for code, event_type in enumerate(vocabulary)}
+
+    columns = {}
+    ranges = [{} for _ in seasons]
+
+    tables = [(table, column) for table in COLUMNAR_TABLES for column in seasons[0][table]] if seasons else []
+
+    for table, column in tables + [("event_offsets", None)]:
+        parts = []
+        start = 0
+
+        for season, season_ranges in zip(seasons, ranges):
+            values = season[table] if column is None else season[table][column]
+            if (table, column) == ("events", "type"):
+                remap = np.array([codes[t] for t in season["event_types"]], dtype=values.dtype)
+                values = remap[values] if len(values) else values
+
+            parts.append(values)
+            season_ranges[table] = [start, start + len(values)]
+            start += len(values)
+
+        name = table if column is None else f"{table}.{column}"
+        columns[name] = np.ascontiguousarray(np.concatenate(parts))
+
+    meta = {
+        "version": COLUMNAR_VERSION,
+        "build": time.time_ns(),
+        "event_types": vocabulary,
+        "seasons": [
+            {**_file_fingerprint(season_file), "season_id": season["season_id"], "ranges": season_ranges}
+            for season_file, season, season_ranges in zip(season_files, seasons, ranges)
+        ],
+        "columns": {}
+    }
+
+    offset = 0
+    for name, values in columns.items():
+        offset = _aligned(offset)
+        meta["columns"][name] = {
+            "dtype": values.dtype.str,
+            "shape": list(values.shape),
+            "offset": offset
+        }
+        offset += values.nbytes
+
+    header = json.dumps(meta).encode("utf-8")
+    data_start = _aligned(SHARED_STORE_HEADER + len(header))
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+
+    with open(tmp_path, "wb") as f:
+        f.write(SHARED_STORE_MAGIC)
+        f.write(np.uint64(len(header)).tobytes())
+        f.write(header)
+
+        for name, values in columns.items():
+            f.write(b"\0" * (data_start + meta["columns"][name]["offset"] - f.tell()))
+            f.write(values.tobytes())
+
+    # cabecera y datos se sustituyen a la vez, de forma atómica
+    os.replace(tmp_path, path)
+
+    return path
+
+
+def _store_covers(season_files, meta):
+    """
+    True si el almacén contiene todas las temporadas de season_files sin
+    cambios (tamaño y mtime). Puede contener más.
+    """
+    if meta is None or meta.get("version") != COLUMNAR_VERSION:
+        return False
+
+    stored = [
+        {key: season[key] for key in ("path", "size", "mtime_ns")}
+        for season in meta["seasons"]
+    ]
+    return all(_file_fingerprint(season_file) in stored for season_file in season_files)
+
+
+def _read_header(path):
+    """
+    (meta, primer byte de datos) de un almacén, o (None, None) si el
+    fichero no existe o no es un almacén.
+    """
+    try:
+        with open(path, "rb") as f:
+            if f.read(len(SHARED_STORE_MAGIC)) != SHARED_STORE_MAGIC:
+                return None, None
+
+            length = int(np.frombuffer(f.read(8), dtype=np.uint64)[0])
+            meta = json.loads(f.read(length).decode("utf-8"))
+    except (OSError, ValueError, IndexError):
+        return None, None
+
+    return meta, _aligned(SHARED_STORE_HEADER + length)
+
+
+class SharedSeasonStore:
+    """
+    Todas las temporadas en un fichero mapeado en memoria de solo lectura
+    (ver build_shared_store).
+
+    columnar(season_file) devuelve lo mismo que load_season_columnar pero
+    como vistas del mapa, sin copiar: todos los procesos que abren el
+    fichero comparten las mismas páginas de la caché del sistema. Al
+    enviarse a otro proceso solo viajan la ruta y el identificador de la
+    versión del fichero; allí se vuelve a mapear y, si el fichero se ha
+    reconstruido entretanto, se lanza RuntimeError.
+    """
+
+    def __init__(self, path=SHARED_STORE_PATH):
+        self.path = path
+        self.meta, self._data_start = _read_header(path)
+
+        if self.meta is None:
+            raise FileNotFoundError(f"No existe el almacén compartido {path}")
+
+        self.season_files = [season["path"] for season in self.meta["seasons"]]
+        self._seasons = {
+            season["path"]: season
+            for season in self.meta["seasons"]
+        }
+        self._columns = {
+            name: self._map(column)
+            for name, column in self.meta["columns"].items()
+        }
+        self._event_categories = event_categories(self.meta["event_types"])
+        self._views = {}
+
+    def _map(self, column):
+        shape = tuple(column["shape"])
+        dtype = np.dtype(column["dtype"])
+
+        if np.prod(shape) == 0:
+            return np.empty(shape, dtype=dtype)
+
+        return np.memmap(
+            self.path, dtype=dtype, mode="r", offset=self._data_start + column["offset"], shape=shape
+        )
+
+    def __getstate__(self):
+        return {"path": self.path, "build": self.meta["build"]}
+
+    def __setstate__(self, state):
+        self.__init__(state["path"])
+
+        if self.meta["build"] != state["build"]:
+            raise RuntimeError(f"El almacén compartido {self.path} se reconstruyó mientras se usaba")
+
+    def __iter__(self):
+        return iter(self.season_files)
+
+    def __len__(self):
+        return len(self.season_files)
+
+    def columnar(self, season_file):
+        key = os.path.abspath(season_file)
+
+        if key not in self._views:
+            season = self._seasons[key]
+            ranges = season["ranges"]
+
+            view = {
+                "season_id": season["season_id"],
+                "event_types": self.meta["event_types"],
+                "event_categories": self._event_categories,
+                "event_offsets": self._columns["event_offsets"][slice(*ranges["event_offsets"])]
+            }
+            for name, values in self._columns.items():
+                if "." in name:
+                    table, column = name.split(".", 1)
+                    view.setdefault(table, {})[column] = values[slice(*ranges[table])]
+
+            self._views[key] = view
+
+        return self._views[key]
+
+
+def open_shared_store(season_files=(), path=SHARED_STORE_PATH, data_dir=DATA_DIR):
+    """
+    SharedSeasonStore con todas las temporadas de data_dir (más las de
+    season_files que estén fuera), reconstruyendo el fichero si no existe,
+    si falta alguna o si alguna cambió (tamaño o mtime).
+
+    Todos los scripts comparten el mismo fichero aunque usen subconjuntos
+    distintos de temporadas: cada uno lee solo sus tramos.
+    """
+    season_files = [os.path.abspath(season_file) for season_file in season_files]
+    discovered = [os.path.abspath(season_file) for season_file in discover_season_files(data_dir)]
+    all_files = discovered + [season_file for season_file in season_files if season_file not in discovered]
+
+    meta, _ = _read_header(path)
+    if not _store_covers(all_files, meta):
+        build_shared_store(all_files, path)
+
+    return SharedSeasonStore(path)
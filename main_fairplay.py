@@ -1,38 +1,20 @@
+import os
+
 from analysis.fair_play_goleadas import build_fair_play_table
-from config import DATA_DIR
+from data_io.catalog import SeasonCatalog
+from data_io.registry import resolve_season_files
+from data_io.shared import open_shared_store
 from viz.fair_play_plots import (plot_yellow_rate_ratio, plot_goleada_minutes_boxplot,
                                  plot_minutes_per_yellow_goleada_vs_outside,
                                  plot_goleada_yellows_boxplot, plot_minutes_vs_yellow_ratio)
 
-SEASON_FILES = [
-    DATA_DIR / "season_2000-01.json",
-    DATA_DIR / "season_2001-02.json",
-    DATA_DIR / "season_2002-03.json",
-    DATA_DIR / "season_2003-04.json",
-    DATA_DIR / "season_2004-05.json",
-    DATA_DIR / "season_2005-06.json",
-    DATA_DIR / "season_2006-07.json",
-    DATA_DIR / "season_2007-08.json",
-    DATA_DIR / "season_2008-09.json",
-    DATA_DIR / "season_2009-10.json",
-    DATA_DIR / "season_2010-11.json",
-    DATA_DIR / "season_2011-12.json",
-    DATA_DIR / "season_2012-13.json",
-    DATA_DIR / "season_2013-14.json",
-    DATA_DIR / "season_2014-15.json",
-    DATA_DIR / "season_2015-16.json",
-    DATA_DIR / "season_2016-17.json",
-    DATA_DIR / "season_2017-18.json",
-    DATA_DIR / "season_2018-19.json",
-    DATA_DIR / "season_2018-19.json",
-    DATA_DIR / "season_2019-20.json",
-    DATA_DIR / "season_2020-21.json",
-    DATA_DIR / "season_2021-22.json",
-]
+SEASON_FILES = resolve_season_files("2000-01", "2021-22")
 
 
 if __name__ == "__main__":
-    df_fp = build_fair_play_table(SEASON_FILES)
+    # los procesos mapean el mismo fichero de temporadas en vez de cargarlas
+    catalog = SeasonCatalog(SEASON_FILES, store=open_shared_store(SEASON_FILES))
+    df_fp = build_fair_play_table(catalog, jobs=os.cpu_count())
     # # No se va a usar
     # #plot_yellow_rate_goleadas(df_fp)
     # Gráfico principal:
@@ -1,24 +1,39 @@
+import os
+
 from analysis.var_disallowed import *
 from viz.var_plots import *
-from data_io.loader import build_match_lookup
+from data_io.catalog import SeasonCatalog
+from data_io.shared import open_shared_store
+from match.events import GoalIndex
+from data_io.registry import resolve_season_files
 
-SEASON_FILES = [
-    DATA_DIR / "season_2018-19.json",
-    DATA_DIR / "season_2019-20.json",
-    DATA_DIR / "season_2020-21.json",
-    DATA_DIR / "season_2021-22.json",
-]
+SEASON_FILES = resolve_season_files("2018-19", "2021-22")
 
 if __name__ == "__main__":
-    match_lookup = build_match_lookup(SEASON_FILES)
+    # cada temporada se parsea una sola vez para todo el análisis
+    catalog = SeasonCatalog(SEASON_FILES, store=open_shared_store(SEASON_FILES))
+
+    # goles encajados por partido, indexados una vez para VAR y controles
+    goal_index = GoalIndex(catalog.match_lookup())
 
-    df_var = extract_var_events(SEASON_FILES)
+    df_var = extract_var_events(catalog)
 
-    df_control_candidates = build_control_candidates(SEASON_FILES, DEFAULT_BIN)
-    df_control = match_controls(df_var, df_control_candidates, DEFAULT_BIN)
+    # solo los candidatos de los estratos y minutos de los eventos VAR
+    df_control_candidates = build_control_candidates(catalog, DEFAULT_BIN, df_var=df_var)
+    # misma selección de controles que las figuras del informe
+    df_control = match_controls(
+        df_var, df_control_candidates, DEFAULT_BIN, legacy_sampling=True
+    )
 
-    df_var_analysis = build_var_analysis(df_var, match_lookup)
-    df_control_analysis = build_control_analysis(df_control, match_lookup)
+    # sensibilidad al sorteo de controles: DEFAULT_N_ENSEMBLE semillas
+    df_ensemble = control_ensemble(
+        df_var, df_control_candidates, goal_index, DEFAULT_BIN,
+        seeds=range(DEFAULT_N_ENSEMBLE), jobs=os.cpu_count()
+    )
+    print(df_ensemble.groupby("state")[["p_control", "diff"]].describe().T)
+
+    df_var_analysis = build_var_analysis(df_var, goal_index)
+    df_control_analysis = build_control_analysis(df_control, goal_index)
 
     df_analysis = pd.concat(
         [df_var_analysis, df_control_analysis],
@@ -30,8 +45,15 @@ if __name__ == "__main__":
     t_var, p_var = curves[VAR_GROUP]
     t_ctrl, p_ctrl = curves[CONTROL_GROUP]
 
-    plot_goal_curves(t_var, p_var, t_ctrl, p_ctrl)
-    interaction_plot_by_state(df_analysis, horizon=15)
+    # bandas bootstrap al 95% y p-valor por permutación
+    resampled = bootstrap_concede_curves(df_analysis, jobs=os.cpu_count())
+    resampled_by_state = bootstrap_concede_curves(
+        df_analysis, n_perm=0, by=["state", "group"], jobs=os.cpu_count()
+    )
+    print(f"Permutation test VAR vs CONTROL: p = {resampled['p_value']:.4f}")
+
+    plot_goal_curves(t_var, p_var, t_ctrl, p_ctrl, bands=resampled["bands"])
+    interaction_plot_by_state(df_analysis, horizon=15, bands=resampled_by_state["bands"])
     boxplot_time_to_goal(df_analysis, max_t=15)
     plot_var_minute_distribution(df_var)
     plot_var_state_distribution(df_var)
@@ -1,11 +1,25 @@
+import numpy as np
+
 from config import *
+from data_io.loader import Match, event_type_mask
+
+# Separación entre partidos/equipos en la clave ordenada de GoalIndex
+# (mayor que cualquier minuto)
+GOAL_KEY_STRIDE = 1000
 
 
 def time_to_concede(events, minute_event, team, t_max):
     """
     Devuelve (t_event, event_occurred)
+
+    events: lista de dicts de eventos (load_season o Match.events).
     """
-    for e in sorted(events, key=lambda e: e["minute"]):
+    if isinstance(events, np.ndarray):
+        raise TypeError("time_to_concede espera dicts de eventos, no Match.event_array")
+
+    next_goal = None
+
+    for e in events:
         if e["minute"] <= minute_event:
             continue
         if e["minute"] > MATCH_END_MINUTE:
@@ -22,8 +36,133 @@ def time_to_concede(events, minute_event, team, t_max):
             if e["team"] == team:
                 continue
 
-        t_event = e["minute"] - minute_event
-        if t_event <= t_max:
-            return t_event, 1
+        # basta con el primer gol encajado, no hace falta ordenar
+        if next_goal is None or e["minute"] < next_goal:
+            next_goal = e["minute"]
+
+    if next_goal is not None and next_goal - minute_event <= t_max:
+        return next_goal - minute_event, 1
 
     return t_max, 0
+
+
+def lookup_event_columns(match_lookup, event_types):
+    """
+    (posición del partido en match_lookup, minuto, equipo) de los eventos
+    de event_types con minuto <= MATCH_END_MINUTE, como arrays int64.
+
+    Con objetos Match (data_io.loader) se filtran los arrays de cada
+    temporada de una vez; con dicts de eventos, en una pasada por ellos.
+    """
+    matches = list(match_lookup.values())
+
+    if matches and all(isinstance(match, Match) for match in matches):
+        by_season = {}
+        for i, match in enumerate(matches):
+            season, positions = by_season.setdefault(id(match.season), (match.season, {}))
+            positions[match.index] = i
+
+        columns = []
+        for season, positions in by_season.values():
+            events = season["events"]
+
+            position = np.full(len(season["matches"]["id"]), -1, dtype=np.int64)
+            position[list(positions)] = list(positions.values())
+
+            mask = (
+                event_type_mask(season, event_types) &
+                (events["minute"] <= MATCH_END_MINUTE) &
+                (position[events["match"]] >= 0)
+            )
+            columns.append(np.column_stack([
+                position[events["match"][mask]],
+                events["minute"][mask],
+                events["team"][mask]
+            ]).astype(np.int64))
+
+        selected = np.concatenate(columns)
+    else:
+        selected = np.array([
+            (i, e["minute"], TEAM_CODES[e["team"]])
+            for i, match in enumerate(matches)
+            for e in match["events"]
+            if e["type"] in event_types and e["minute"] <= MATCH_END_MINUTE
+        ], dtype=np.int64).reshape(-1, 3)
+
+    return selected[:, 0], selected[:, 1], selected[:, 2]
+
+
+class GoalIndex:
+    """
+    Minutos de los goles encajados por cada equipo en cada partido,
+    ordenados una sola vez para responder time_to_concede con búsqueda
+    binaria (np.searchsorted), también por lotes.
+
+    match_lookup: {match_id: partido}, con objetos Match o dicts.
+    event_types: tipos de evento indexados (por defecto los goles).
+    against: True = cada evento se asigna al rival del equipo que lo
+        protagoniza (gol encajado); False = al propio equipo.
+    """
+
+    def __init__(self, match_lookup, event_types=GOAL_EVENTS, against=True):
+        self.match_index = {
+            match_id: i
+            for i, match_id in enumerate(match_lookup)
+        }
+
+        match_idx, minutes, teams = lookup_event_columns(match_lookup, event_types)
+
+        # el gol lo encaja el otro equipo
+        if against:
+            teams = 1 - teams
+
+        self.keys = np.sort((2 * match_idx + teams) * GOAL_KEY_STRIDE + minutes)
+
+    @staticmethod
+    def _key(match_idx, team):
+        return (2 * match_idx + TEAM_CODES[team]) * GOAL_KEY_STRIDE
+
+    def conceded_minutes(self, match_id, team):
+        base = self._key(self.match_index[match_id], team)
+        lo, hi = np.searchsorted(self.keys, [base, base + GOAL_KEY_STRIDE])
+        return self.keys[lo:hi] - base
+
+    def time_to_concede(self, match_id, minute_event, team, t_max):
+        t_event, occurred = self.time_to_concede_many(
+            [match_id], [minute_event], [team], t_max
+        )
+        return int(t_event[0]), int(occurred[0])
+
+    def time_to_concede_many(self, match_ids, minutes, teams, t_max):
+        """
+        Versión vectorizada de time_to_concede.
+
+        match_ids, minutes, teams: secuencias de la misma longitud.
+        t_max: escalar o array por consulta.
+        Devuelve (t_event, event_occurred) como arrays int64.
+        """
+        match_idx = np.array([self.match_index[m] for m in match_ids], dtype=np.int64)
+        minutes = np.asarray(minutes, dtype=np.int64)
+        away = np.asarray(teams) == AWAY_TEAM
+        t_max = np.broadcast_to(np.asarray(t_max, dtype=np.int64), minutes.shape)
+
+        base = (2 * match_idx + away) * GOAL_KEY_STRIDE
+
+        # primer gol encajado con minuto > minute_event
+        pos = np.searchsorted(self.keys, base + minutes, side="right")
+        next_key = np.append(self.keys, -1)[pos]
+        found = (next_key >= base) & (next_key < base + GOAL_KEY_STRIDE)
+
+        t_event = next_key - base - minutes
+        occurred = found & (t_event <= t_max)
+
+        return np.where(occurred, t_event, t_max), occurred.astype(np.int64)
+
+
+def as_goal_index(match_lookup):
+    """
+    Acepta un lookup de partidos o un GoalIndex ya construido.
+    """
+    if isinstance(match_lookup, GoalIndex):
+        return match_lookup
+    return GoalIndex(match_lookup)
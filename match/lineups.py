@@ -0,0 +1,145 @@
+import numpy as np
+
+from config import *
+
+# fin de los intervalos de jugadores que no salen del campo (abiertos,
+# incluyen el tiempo añadido)
+OPEN_STINT_END = np.iinfo(np.int32).max
+
+
+def season_stints(season):
+    """
+    Intervalos en el campo de todos los jugadores de una temporada
+    columnar (ver data_io.loader.load_season_columnar).
+
+    Un jugador titular entra en el minuto 0 y uno suplente en el de su
+    "Comes on"; sale en el primer "Goes off" o roja. Si no sale, el
+    intervalo queda abierto (off = OPEN_STINT_END). Con el criterio de
+    season_state_tensor (estado antes del minuto m) el jugador está en el
+    campo en los minutos on < m <= off.
+
+    Devuelve un dict de arrays ordenados por (partido, equipo):
+    match, team (0 local, 1 visitante), player, started, on, off.
+    """
+    events = season["events"]
+    lineups = season["lineups"]
+    n_players = max(len(season["players"]["href"]), 1)
+
+    is_red = (season["event_categories"][events["type"]] & RED_BIT) != 0
+
+    known = events["player"] >= 0
+    comes_on = known & (events["type"] == EVENT_CODES[SUB_ON_EVENT])
+    leaves = known & ((events["type"] == EVENT_CODES[SUB_OFF_EVENT]) | is_red)
+
+    starters = lineups["starter"] & (lineups["player"] >= 0)
+    n_starters = np.count_nonzero(starters)
+    n_subs = np.count_nonzero(comes_on)
+
+    match = np.concatenate([lineups["match"][starters], events["match"][comes_on]]).astype(np.int64)
+    team = np.concatenate([lineups["team"][starters], events["team"][comes_on]]).astype(np.int8)
+    player = np.concatenate([lineups["player"][starters], events["player"][comes_on]]).astype(np.int64)
+    started = np.concatenate([np.ones(n_starters, dtype=bool), np.zeros(n_subs, dtype=bool)])
+    on = np.concatenate([np.zeros(n_starters, dtype=np.int64), events["minute"][comes_on]])
+
+    # un intervalo por (partido, jugador): la primera entrada (titular antes que suplente)
+    key = match * n_players + player
+    key, first = np.unique(key, return_index=True)
+    match, team, player, started, on = match[first], team[first], player[first], started[first], on[first]
+
+    # primera salida de cada (partido, jugador)
+    off = np.full(len(key), OPEN_STINT_END, dtype=np.int64)
+    leave_key = events["match"][leaves].astype(np.int64) * n_players + events["player"][leaves]
+    pos = np.searchsorted(key, leave_key)
+    found = (pos < len(key)) & (key[np.minimum(pos, len(key) - 1)] == leave_key)
+    np.minimum.at(off, pos[found], events["minute"][leaves][found].astype(np.int64))
+
+    order = np.argsort(2 * match + team, kind="stable")
+
+    return {
+        "match": match[order],
+        "team": team[order],
+        "player": player[order],
+        "started": started[order],
+        "on": on[order],
+        "off": off[order]
+    }
+
+
+class LineupTimeline:
+    """
+    Jugadores en el campo de todos los partidos de una temporada columnar,
+    guardados como un intervalo (on, off] por jugador y partido.
+
+    Los intervalos de cada (partido, equipo) son contiguos: la fila
+    2 * partido + equipo ocupa [offsets[k], offsets[k + 1]).
+    """
+
+    def __init__(self, season):
+        self.n_matches = len(season["matches"]["id"])
+        self.stints = season_stints(season)
+
+        row = 2 * self.stints["match"] + self.stints["team"]
+        self.row = row
+        self.offsets = np.concatenate((
+            [0], np.cumsum(np.bincount(row, minlength=2 * self.n_matches))
+        ))
+
+    def players_at(self, match_idx, minute):
+        """
+        (local, visitante): índices de jugador en el campo en el minuto
+        minute (criterio de season_state_tensor: eventos con minuto < minute).
+        """
+        teams = []
+
+        for k in (2 * match_idx, 2 * match_idx + 1):
+            lo, hi = self.offsets[k], self.offsets[k + 1]
+            on_field = (self.stints["on"][lo:hi] < minute) & (minute <= self.stints["off"][lo:hi])
+            teams.append(self.stints["player"][lo:hi][on_field])
+
+        return teams[0], teams[1]
+
+    def minutes_played(self, first=MATCH_START_MINUTE, last=MATCH_END_MINUTE):
+        """
+        Minutos de cada intervalo dentro de first..last (ambos inclusive).
+        Las salidas anotadas antes de la entrada cuentan 0 minutos.
+        """
+        on = np.clip(self.stints["on"], first - 1, last)
+        off = np.clip(self.stints["off"], first - 1, last)
+        return np.maximum(off - on, 0)
+
+    def on_field_counts(self, n_minutes=STATE_TENSOR_MINUTES):
+        """
+        Array (2 * n_partidos, n_minutes): jugadores en el campo de cada
+        equipo en cada minuto, con una suma acumulada de entradas y salidas.
+        Las salidas anotadas antes de la entrada no cuentan.
+        """
+        on, off = self.stints["on"], self.stints["off"]
+        valid = off > on
+        row = self.row[valid]
+
+        counts = np.zeros((2 * self.n_matches, n_minutes + 1), dtype=np.int16)
+        np.add.at(counts, (row, np.clip(on[valid] + 1, 0, n_minutes)), 1)
+        np.add.at(counts, (row, np.clip(off[valid] + 1, 0, n_minutes)), -1)
+
+        return np.cumsum(counts, axis=1, dtype=np.int16)[:, :n_minutes]
+
+    def exposure_mean(self, values, valid=None):
+        """
+        Media por (partido, equipo) de un valor por intervalo (alineado con
+        self.stints) ponderada por los minutos jugados. Solo cuentan los
+        intervalos con valid (por defecto todos).
+
+        Devuelve un array de 2 * n_partidos (NaN si no hay minutos).
+        """
+        weight = self.minutes_played().astype(np.float64)
+
+        if valid is not None:
+            weight = np.where(valid, weight, 0)
+
+        weighted = np.where(weight > 0, values * weight, 0)
+
+        total = np.bincount(self.row, weights=weighted, minlength=2 * self.n_matches)
+        minutes = np.bincount(self.row, weights=weight, minlength=2 * self.n_matches)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return total / minutes
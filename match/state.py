@@ -1,65 +1,286 @@
+import numpy as np
+
 from config import *
+from data_io.loader import load_season_columnar
 
-def score_at_minute(events, minute):
-    home_goals = 0
-    away_goals = 0
+# Canales del tensor de estado (último eje)
+HOME_GOALS, AWAY_GOALS, HOME_PLAYERS, AWAY_PLAYERS = range(4)
 
-    for e in events:
-        if e["minute"] >= minute:
-            continue
-        if e["type"] not in GOAL_EVENTS:
-            continue
 
-        if e["team"] == "home":
-            home_goals += 1
-        elif e["team"] == "away":
-            away_goals += 1
+class MatchTimeline:
+    """
+    Marcador y jugadores de un partido precalculados para todos los minutos.
 
-    return home_goals, away_goals
+    Para cada minuto m se guarda lo ocurrido en eventos con minuto < m
+    (mismo criterio que score_at_minute), así cada consulta es O(1).
+    """
 
-def players_on_field(events, minute):
-    home_reds = 0
-    away_reds = 0
+    def __init__(self, events):
+        self.events = events
+
+        minutes = np.fromiter((e["minute"] for e in events), dtype=np.int16, count=len(events))
+        teams = np.fromiter((TEAM_CODES[e["team"]] for e in events), dtype=np.int8, count=len(events))
+        categories = np.fromiter(
+            (EVENT_CATEGORIES.get(e["type"], 0) for e in events), dtype=np.uint8, count=len(events)
+        )
+
+        # índice k <-> minuto k + offset
+        self.offset = min(0, int(minutes.min())) if len(events) else 0
+        last_minute = max(MATCH_MAX_MINUTE_ITER, int(minutes.max()) + 1 if len(events) else 0)
+        size = last_minute - self.offset + 1
+
+        def cumulative(bit, team):
+            mask = ((categories & bit) != 0) & (teams == TEAM_CODES[team])
+            counts = np.bincount(minutes[mask] - self.offset + 1, minlength=size)
+            return np.cumsum(counts[:size], dtype=np.int16)
+
+        self.home_goals = cumulative(GOAL_BIT, HOME_TEAM)
+        self.away_goals = cumulative(GOAL_BIT, AWAY_TEAM)
+        self.home_reds = cumulative(RED_BIT, HOME_TEAM)
+        self.away_reds = cumulative(RED_BIT, AWAY_TEAM)
+
+    def _index(self, minute):
+        return min(max(minute - self.offset, 0), len(self.home_goals) - 1)
+
+    def score_at(self, minute):
+        k = self._index(minute)
+        return int(self.home_goals[k]), int(self.away_goals[k])
+
+    def players_at(self, minute):
+        k = self._index(minute)
+        return (
+            INITIAL_PLAYERS - int(self.home_reds[k]),
+            INITIAL_PLAYERS - int(self.away_reds[k])
+        )
+
+    def goal_diff_at(self, minutes):
+        """
+        Diferencia local - visitante en varios minutos a la vez (array).
+        """
+        k = np.clip(np.asarray(minutes) - self.offset, 0, len(self.home_goals) - 1)
+        return self.home_goals[k] - self.away_goals[k]
+
+    def segments(self):
+        """
+        Tramos de minutos con el mismo estado (run-length), como lista de
+        (start, end, home_goals, away_goals, home_players, away_players)
+        con end inclusive. Cubren desde el primer al último minuto guardado.
+        """
+        state = np.column_stack([
+            self.home_goals,
+            self.away_goals,
+            INITIAL_PLAYERS - self.home_reds,
+            INITIAL_PLAYERS - self.away_reds
+        ])
+        starts = np.flatnonzero(np.concatenate(([True], (state[1:] != state[:-1]).any(axis=1))))
+        ends = np.append(starts[1:] - 1, len(state) - 1)
+
+        return [
+            (int(start) + self.offset, int(end) + self.offset, *map(int, state[start]))
+            for start, end in zip(starts, ends)
+        ]
+
+    def state_at(self, minute, team):
+        # marcador
+        home_goals, away_goals = self.score_at(minute)
 
-    for e in events:
-        if e["minute"] >= minute:
-            continue
-        if e["type"] not in RED_EVENTS:
-            continue
+        # jugadores
+        home_players, away_players = self.players_at(minute)
 
-        if e["team"] == "home":
-            home_reds += 1
-        elif e["team"] == "away":
-            away_reds += 1
+        if team == "home":
+            diff = home_goals - away_goals
+            team_players = home_players
+            opp_players = away_players
+        else:
+            diff = away_goals - home_goals
+            team_players = away_players
+            opp_players = home_players
 
-    return INITIAL_PLAYERS - home_reds, INITIAL_PLAYERS - away_reds
+        if diff > 0:
+            state = STATE_WINNING
+        elif diff < 0:
+            state = STATE_LOSING
+        else:
+            state = STATE_DRAWING
+
+        return {
+            "goal_diff": diff,
+            "state": state,
+            "team_players": team_players,
+            "opp_players": opp_players
+        }
+
+
+def as_timeline(events):
+    """
+    Acepta una lista de eventos o un MatchTimeline ya construido.
+    """
+    if isinstance(events, MatchTimeline):
+        return events
+    return MatchTimeline(events)
+
+def score_at_minute(events, minute):
+    return as_timeline(events).score_at(minute)
+
+def players_on_field(events, minute):
+    return as_timeline(events).players_at(minute)
 
 def match_state_at_minute(events, minute, team):
-    # marcador
-    home_goals, away_goals = score_at_minute(events, minute)
-
-    # jugadores
-    home_players, away_players = players_on_field(events, minute)
-
-    if team == "home":
-        diff = home_goals - away_goals
-        team_players = home_players
-        opp_players = away_players
-    else:
-        diff = away_goals - home_goals
-        team_players = away_players
-        opp_players = home_players
-
-    if diff > 0:
-        state = STATE_WINNING
-    elif diff < 0:
-        state = STATE_LOSING
-    else:
-        state = STATE_DRAWING
-
-    return {
-        "goal_diff": diff,
-        "state": state,
-        "team_players": team_players,
-        "opp_players": opp_players
-    }
\ No newline at end of file
+    return as_timeline(events).state_at(minute, team)
+
+
+def state_channels(season):
+    """
+    Canal de cada evento de una temporada columnar en el tensor de estado:
+    0/1 goles, 2/3 rojas (local/visitante); -1 = no cuenta.
+    """
+    events = season["events"]
+    category = season["event_categories"][events["type"]]
+
+    is_goal = (category & GOAL_BIT) != 0
+    is_red = (category & RED_BIT) != 0
+
+    channel = np.full(len(events["type"]), -1, dtype=np.int8)
+    channel[is_goal] = events["team"][is_goal]
+    channel[is_red] = 2 + events["team"][is_red]
+
+    return channel
+
+def season_state_tensor(season, n_minutes=STATE_TENSOR_MINUTES):
+    """
+    Estado de todos los partidos de una temporada columnar
+    (ver data_io.loader.load_season_columnar) en un único array.
+
+    Devuelve un array int16 de forma (n_partidos, n_minutes, 4) donde
+    [i, m] es el estado antes del minuto m (eventos con minuto < m):
+    goles local, goles visitante, jugadores local, jugadores visitante.
+    """
+    events = season["events"]
+    n_matches = len(season["matches"]["id"])
+
+    channel = state_channels(season)
+
+    # un evento del minuto e cuenta a partir del minuto e + 1
+    slot = events["minute"].astype(np.int64) + 1
+    keep = (channel >= 0) & (slot < n_minutes)
+
+    counts = np.zeros((n_matches, n_minutes, 4), dtype=np.int16)
+    np.add.at(
+        counts,
+        (events["match"][keep], slot[keep], channel[keep]),
+        1
+    )
+
+    state = np.cumsum(counts, axis=1, dtype=np.int16)
+    state[:, :, HOME_PLAYERS:] = INITIAL_PLAYERS - state[:, :, HOME_PLAYERS:]
+
+    return state
+
+
+class StateSegments:
+    """
+    Estado de todos los partidos de una temporada columnar codificado por
+    tramos (run-length): cada partido es una lista corta de tramos
+    [start, end] de minutos con el mismo marcador y jugadores, con el mismo
+    criterio que season_state_tensor (estado antes del minuto m).
+
+    Todo va en arrays planos ordenados por (partido, start):
+    - match, start, end (inclusive)
+    - state: (n_tramos, 4) con los canales HOME_GOALS, AWAY_GOALS,
+      HOME_PLAYERS y AWAY_PLAYERS
+    - offsets: tramos del partido i en [offsets[i], offsets[i + 1])
+
+    La búsqueda de un minuto es O(log k) con np.searchsorted y los
+    agregados por estado se hacen por tramo (ver durations).
+    """
+
+    def __init__(self, season, n_minutes=STATE_TENSOR_MINUTES):
+        events = season["events"]
+        n_matches = len(season["matches"]["id"])
+        self.n_minutes = n_minutes
+
+        channel = state_channels(season)
+        slot = events["minute"].astype(np.int64) + 1
+        keep = (channel >= 0) & (slot < n_minutes)
+
+        # cada partido empieza un tramo en 0 y en cada minuto con cambios
+        event_keys = events["match"][keep].astype(np.int64) * n_minutes + slot[keep]
+        self.keys = np.unique(np.concatenate([
+            np.arange(n_matches, dtype=np.int64) * n_minutes,
+            event_keys
+        ]))
+
+        self.match = self.keys // n_minutes
+        self.start = self.keys % n_minutes
+        same_match = np.append(self.match[1:] == self.match[:-1], False)
+        self.end = np.where(same_match, np.append(self.start[1:], 0) - 1, n_minutes - 1)
+        self.offsets = np.searchsorted(self.match, np.arange(n_matches + 1))
+
+        # cambios de cada tramo y acumulado dentro de su partido
+        changes = np.zeros((len(self.keys), 4), dtype=np.int64)
+        np.add.at(changes, (np.searchsorted(self.keys, event_keys), channel[keep]), 1)
+
+        cumulative = np.cumsum(changes, axis=0)
+        first = self.offsets[self.match]
+        state = cumulative - cumulative[first] + changes[first]
+        state[:, HOME_PLAYERS:] = INITIAL_PLAYERS - state[:, HOME_PLAYERS:]
+        self.state = state.astype(np.int16)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def segment_at(self, match_idx, minutes):
+        """
+        Índice del tramo de cada (partido, minuto); vectorizado.
+        """
+        minutes = np.clip(np.asarray(minutes, dtype=np.int64), 0, self.n_minutes - 1)
+        keys = np.asarray(match_idx, dtype=np.int64) * self.n_minutes + minutes
+        return np.searchsorted(self.keys, keys, side="right") - 1
+
+    def state_at(self, match_idx, minutes):
+        return self.state[self.segment_at(match_idx, minutes)]
+
+    def goal_diff(self):
+        """
+        Diferencia local - visitante de cada tramo.
+        """
+        return self.state[:, HOME_GOALS].astype(np.int64) - self.state[:, AWAY_GOALS]
+
+    def durations(self, first=MATCH_START_MINUTE, last=MATCH_END_MINUTE):
+        """
+        Minutos de cada tramo dentro de first..last (ambos inclusive).
+        Los minutos en un estado salen de sumar estos pesos por tramo.
+        """
+        start = np.maximum(self.start, first)
+        end = np.minimum(self.end, last)
+        return np.maximum(end - start + 1, 0)
+
+    def match_segments(self, match_idx):
+        """
+        Tramos de un partido como lista de (start, end, home_goals,
+        away_goals, home_players, away_players), como MatchTimeline.segments.
+        """
+        lo, hi = self.offsets[match_idx], self.offsets[match_idx + 1]
+
+        return [
+            (int(start), int(end), *map(int, state))
+            for start, end, state in zip(self.start[lo:hi], self.end[lo:hi], self.state[lo:hi])
+        ]
+
+
+def build_state_tensor(season_files, n_minutes=STATE_TENSOR_MINUTES):
+    """
+    season_state_tensor para varias temporadas concatenadas.
+
+    Devuelve (tensor, match_ids) con las filas del tensor en el mismo
+    orden que match_ids.
+    """
+    tensors = []
+    match_ids = []
+
+    for season_file in season_files:
+        season = load_season_columnar(season_file)
+        tensors.append(season_state_tensor(season, n_minutes))
+        match_ids.append(season["matches"]["id"])
+
+    return np.concatenate(tensors), np.concatenate(match_ids)
@@ -2,11 +2,10 @@ import pandas as pd
 import matplotlib.pyplot as plt
 from config import GOLEADA_THRESHOLD
 
-def plot_yellow_rate_ratio(df_fp):
+def yellow_rate_ratio(df_fp):
     """
-    Line plot del ratio:
+    Ratio por temporada:
     (amarillas/minuto en goleada) / (amarillas/minuto fuera de goleada)
-    por temporada.
     """
 
     df_goleada = df_fp[df_fp["diff"] != "outside"].copy()
@@ -37,35 +36,65 @@ def plot_yellow_rate_ratio(df_fp):
 
     merged["ratio"] = merged["rate_goleada"] / merged["rate_outside"]
 
-    merged = merged.sort_values("season")
+    return merged.sort_values("season")
 
-    plt.figure(figsize=(9, 5))
-    plt.plot(
-        merged["season"],
-        merged["ratio"],
-        marker="o",
-        linewidth=2
-    )
+def plot_yellow_rate_ratio(df_fp):
+    """
+    Line plot del ratio:
+    (amarillas/minuto en goleada) / (amarillas/minuto fuera de goleada)
+    por temporada.
 
-    plt.axhline(
-        y=1.0,
-        color="gray",
-        linestyle="--",
-        linewidth=1,
-        label="Same as non-large goal-difference situation"
+    Si df_fp viene del modo barrido (columna threshold) se dibuja
+    un panel por umbral, con el eje de temporadas compartido.
+    """
+
+    if "threshold" in df_fp.columns:
+        thresholds = sorted(df_fp["threshold"].unique())
+        panels = [
+            (threshold, df_fp[df_fp["threshold"] == threshold])
+            for threshold in thresholds
+        ]
+    else:
+        panels = [(GOLEADA_THRESHOLD, df_fp)]
+
+    fig, axes = plt.subplots(
+        len(panels), 1,
+        sharex=True,
+        squeeze=False,
+        figsize=(9, 5 if len(panels) == 1 else 2.5 * len(panels) + 1)
     )
 
-    plt.xlabel("Season")
-    plt.ylabel("Yellow card ratio (lopsided vs non-lopsided matches)")
-    plt.title(
+    for ax, (threshold, df_threshold) in zip(axes[:, 0], panels):
+        merged = yellow_rate_ratio(df_threshold)
+
+        ax.plot(
+            merged["season"],
+            merged["ratio"],
+            marker="o",
+            linewidth=2
+        )
+
+        ax.axhline(
+            y=1.0,
+            color="gray",
+            linestyle="--",
+            linewidth=1,
+            label="Same as non-large goal-difference situation"
+        )
+
+        ax.set_title(f"Difference ≥ {threshold} goals")
+        ax.set_ylabel("Yellow card ratio")
+        ax.grid(True, axis="y", alpha=0.3)
+
+    axes[0, 0].legend()
+    axes[-1, 0].set_xlabel("Season")
+    axes[-1, 0].tick_params(axis="x", labelrotation=45)
+
+    fig.suptitle(
         "Relative evolution of bookings in large goal-difference situations\n"
-        f"(difference ≥ {GOLEADA_THRESHOLD} goals)"
+        "(lopsided vs non-lopsided matches)"
     )
-
-    plt.xticks(rotation=45)
-    plt.grid(True, axis="y", alpha=0.3)
-    plt.legend()
-    plt.tight_layout()
+    fig.tight_layout()
     plt.show()
 
 def plot_minutes_per_yellow_goleada_vs_outside(df_fp):
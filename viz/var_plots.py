@@ -4,12 +4,20 @@ from matplotlib import pyplot as plt
 from config import *
 
 
-def plot_goal_curves(t_var, p_var, t_ctrl, p_ctrl):
+def plot_goal_curves(t_var, p_var, t_ctrl, p_ctrl, bands=None):
+    """
+    bands: opcional, {grupo: (inferior, superior)} de
+    bootstrap_concede_curves para dibujar las bandas de confianza.
+    """
 
     plt.figure(figsize=(8, 5))
     plt.plot(t_var, p_var, label="VAR disallowed", linewidth=2)
     plt.plot(t_ctrl, p_ctrl, label="Control (no event)", linewidth=2)
 
+    if bands:
+        plt.fill_between(t_var, *bands[VAR_GROUP], color="C0", alpha=0.2)
+        plt.fill_between(t_ctrl, *bands[CONTROL_GROUP], color="C1", alpha=0.2)
+
     plt.xlabel("Minutes after the event")
     plt.ylabel("Cumulative probability of conceding a goal")
     plt.legend()
@@ -17,7 +25,11 @@ def plot_goal_curves(t_var, p_var, t_ctrl, p_ctrl):
     plt.tight_layout()
     plt.show()
 
-def interaction_plot_by_state(df_analysis, horizon=15):
+def interaction_plot_by_state(df_analysis, horizon=15, bands=None):
+    """
+    bands: opcional, bandas de bootstrap_concede_curves con
+    by=["state", "group"] para dibujar barras de error en horizon.
+    """
     states = ["winning", "drawing", "losing"]
     groups = ["VAR", "CONTROL"]
 
@@ -37,7 +49,17 @@ def interaction_plot_by_state(df_analysis, horizon=15):
 
     plt.figure(figsize=(8, 5))
     for i, state in enumerate(states):
-        plt.plot(groups, means[state], marker="o", label=state)
+        if not bands:
+            plt.plot(groups, means[state], marker="o", label=state)
+            continue
+
+        lower = [bands[(state, group)][0][horizon] if (state, group) in bands else np.nan for group in groups]
+        upper = [bands[(state, group)][1][horizon] if (state, group) in bands else np.nan for group in groups]
+        plt.errorbar(
+            groups, means[state],
+            yerr=[np.subtract(means[state], lower), np.subtract(upper, means[state])],
+            marker="o", capsize=4, label=state
+        )
 
     plt.xlabel("Group")
     plt.ylabel(f"P(conceding goal ≤ {horizon} min)")